@@ -1,8 +1,17 @@
 from flask import Flask, request
+from werkzeug.utils import secure_filename
 import os
+import sys
+import uuid
 import cv2
 import numpy as np
 from collections import OrderedDict
+from line_counter import LineCounter
+from box_propagator import BoxPropagator
+
+# Shared person detectors live alongside the crowd counting CLI
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python_ai"))
+from detectors import create_detector
 
 # --- Centroid Tracker ---
 class CentroidTracker:
@@ -13,6 +22,8 @@ class CentroidTracker:
         self.max_disappeared = max_disappeared
         self.max_distance = max_distance
         self.total_count = 0
+        # (object_id, previous_centroid, current_centroid) for the last update
+        self.movements = []
 
     def register(self, centroid):
         self.objects[self.next_object_id] = centroid
@@ -25,6 +36,7 @@ class CentroidTracker:
         del self.disappeared[object_id]
 
     def update(self, rects):
+        self.movements = []
         if len(rects) == 0:
             for object_id in list(self.disappeared.keys()):
                 self.disappeared[object_id] += 1
@@ -55,6 +67,7 @@ class CentroidTracker:
                 if D[row, col] > self.max_distance:
                     continue
                 object_id = object_ids[row]
+                self.movements.append((object_id, object_centroids[row], input_centroids[col]))
                 self.objects[object_id] = input_centroids[col]
                 self.disappeared[object_id] = 0
                 used_rows.add(row)
@@ -75,42 +88,88 @@ class CentroidTracker:
 
 
 # --- Crowd Counter ---
+DEFAULT_COUNTING_LINES = [("Gate", (0.0, 0.5), (1.0, 0.5))]
+# Raw HOG without hit threshold or NMS, as this counter has always used
+DEFAULT_DETECTOR = ("hog", {"hit_threshold": 0.0, "nms": False})
+# Run the detector on every Nth frame of uploads and propagate boxes in between
+UPLOAD_KEYFRAME_INTERVAL = 5
+
+
 class CrowdDensityCounter:
-    def __init__(self):
-        self.hog = cv2.HOGDescriptor()
-        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    def __init__(self, lines=None, detector=None):
+        detector_name, detector_params = detector or DEFAULT_DETECTOR
+        self.detector = create_detector(detector_name, **detector_params)
         self.tracker = CentroidTracker()
+        self.line_counter = LineCounter()
+        # Lines are (name, (x1, y1), (x2, y2)) as frame ratios; crossing to the
+        # right of start -> end as seen on screen counts as "in" (down for Gate)
+        for name, start, end in (lines or DEFAULT_COUNTING_LINES):
+            self.line_counter.add_line(name, start, end)
+        self.propagator = BoxPropagator()
+        self.frame_counts = []
+        self.keyframes = 0
 
     def detect_persons(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        boxes, _ = self.hog.detectMultiScale(gray, winStride=(8, 8), padding=(8, 8), scale=1.05)
-        persons = [(x, y, x + w, y + h) for (x, y, w, h) in boxes]
-        return persons
+        return self.detector.detect(frame)
 
-    def process_video(self, video_path):
+    def process_video(self, video_path, keyframe_interval=1, min_confidence=0.6, show=True):
+        """Count people in a video file.
+
+        With keyframe_interval > 1 the detector runs only on every Nth frame,
+        or sooner when fewer than min_confidence of the boxes could be
+        followed by optical flow; boxes are propagated on the frames between.
+        """
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             return -1
 
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_index = 0
+        last_keyframe = None
+        confidence = 1.0
         while True:
             ret, frame = cap.read()
             if not ret:
                 break
-            persons = self.detect_persons(frame)
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if (last_keyframe is None
+                    or frame_index - last_keyframe >= keyframe_interval
+                    or confidence < min_confidence):
+                persons = self.detect_persons(gray)
+                self.keyframes += 1
+                last_keyframe = frame_index
+                confidence = 1.0
+                if keyframe_interval > 1:
+                    self.propagator.reset(gray, persons)
+            else:
+                persons, confidence = self.propagator.propagate(gray)
+            self.frame_counts.append(len(persons))
+
             _, total_unique = self.tracker.update(persons)
-            cv2.putText(frame,
-                        f"Current: {len(persons)} | Total Unique: {total_unique}",
-                        (20, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.8,
-                        (0, 0, 255),
-                        2)
-            cv2.imshow("Crowd Density Counter", frame)
-            if cv2.waitKey(25) & 0xFF == ord('q'):
-                break
+
+            height, width = frame.shape[:2]
+            self.line_counter.set_frame_size(width, height)
+            self.line_counter.update(self.tracker.movements, frame_index / fps)
+            frame_index += 1
+
+            if show:
+                flow = " | ".join(f"{line['name']} in: {line['in_count']} out: {line['out_count']}"
+                                  for line in self.line_counter.stats())
+                cv2.putText(frame,
+                            f"Current: {len(persons)} | Total Unique: {total_unique} | {flow}",
+                            (20, 40),
+                            cv2.FONT_HERSHEY_SIMPLEX,
+                            0.8,
+                            (0, 0, 255),
+                            2)
+                cv2.imshow("Crowd Density Counter", frame)
+                if cv2.waitKey(25) & 0xFF == ord('q'):
+                    break
 
         cap.release()
-        cv2.destroyAllWindows()
+        if show:
+            cv2.destroyAllWindows()
         return self.tracker.total_count
 
 
@@ -118,6 +177,18 @@ class CrowdDensityCounter:
 app = Flask(__name__)
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Werkzeug spools uploads to disk and refuses bodies above this limit with 413
+MAX_UPLOAD_BYTES = 500 * 1024 * 1024
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+ALLOWED_VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+
+def render_result(message, status=200):
+    with open("index.html", "r", encoding="utf-8") as f:
+        return f.read().replace("{{result}}", message), status
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    return render_result(f"❌ Video is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB", 413)
 
 # Serve index.html directly
 @app.route("/", methods=["GET"])
@@ -128,18 +199,26 @@ def index():
 @app.route("/", methods=["POST"])
 def upload_file():
     if "video" not in request.files or request.files["video"].filename == "":
-        with open("index.html", "r", encoding="utf-8") as f:
-            return f.read().replace("{{result}}", "❌ Please upload a video")
+        return render_result("❌ Please upload a video")
 
     file = request.files["video"]
-    filepath = os.path.join(UPLOAD_FOLDER, file.filename)
+    # Never trust the client's filename; keep only a safe name with a unique prefix
+    filename = secure_filename(file.filename)
+    if os.path.splitext(filename)[1].lower() not in ALLOWED_VIDEO_EXTENSIONS:
+        return render_result("❌ Unsupported video format", 400)
+    filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{filename}")
     file.save(filepath)
 
-    counter = CrowdDensityCounter()
-    unique_count = counter.process_video(filepath)
+    # Frames are decoded one at a time from disk; the upload is removed afterwards
+    try:
+        counter = CrowdDensityCounter()
+        unique_count = counter.process_video(filepath, keyframe_interval=UPLOAD_KEYFRAME_INTERVAL, show=False)
+    finally:
+        os.remove(filepath)
+    flow = ", ".join(f"{line['name']}: {line['in_count']} in / {line['out_count']} out"
+                     for line in counter.line_counter.stats())
 
-    with open("index.html", "r", encoding="utf-8") as f:
-        return f.read().replace("{{result}}", f"✅ Unique people counted: {unique_count}")
+    return render_result(f"✅ Unique people counted: {unique_count} ({flow})")
 
 if __name__ == "__main__":
     app.run(debug=True)
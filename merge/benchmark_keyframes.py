@@ -0,0 +1,63 @@
+"""
+Keyframe benchmark: compares full per-frame detection with keyframe + optical
+flow propagation on sample videos and reports CPU speedup and count error.
+
+Usage: python benchmark_keyframes.py <video> [<video> ...] [--intervals 2,5,10]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app import CrowdDensityCounter
+
+
+def run(video_path, keyframe_interval):
+    counter = CrowdDensityCounter()
+    started_cpu = time.process_time()
+    started_wall = time.perf_counter()
+    unique = counter.process_video(video_path, keyframe_interval=keyframe_interval, show=False)
+    return {
+        "cpu_seconds": time.process_time() - started_cpu,
+        "wall_seconds": time.perf_counter() - started_wall,
+        "frame_counts": np.array(counter.frame_counts),
+        "keyframes": counter.keyframes,
+        "total_unique": unique,
+    }
+
+
+def benchmark(video_path, intervals):
+    baseline = run(video_path, 1)
+    frames = len(baseline["frame_counts"])
+    report = []
+    for interval in intervals:
+        result = run(video_path, interval)
+        counts = result["frame_counts"]
+        error = np.abs(counts - baseline["frame_counts"]) if frames else np.zeros(0)
+        report.append({
+            "video": video_path,
+            "keyframe_interval": interval,
+            "frames": frames,
+            "keyframes": result["keyframes"],
+            "cpu_speedup": round(baseline["cpu_seconds"] / max(result["cpu_seconds"], 1e-9), 2),
+            "wall_speedup": round(baseline["wall_seconds"] / max(result["wall_seconds"], 1e-9), 2),
+            "count_mae": round(float(error.mean()), 2) if frames else 0.0,
+            "count_max_error": int(error.max()) if frames else 0,
+            "total_unique": result["total_unique"],
+            "total_unique_full": baseline["total_unique"],
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keyframe vs full detection benchmark")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--intervals", default="2,5,10", help="Comma-separated keyframe intervals")
+    args = parser.parse_args()
+
+    intervals = [int(value) for value in args.intervals.split(",")]
+    for video in args.videos:
+        for row in benchmark(video, intervals):
+            print(json.dumps(row))
@@ -0,0 +1,79 @@
+"""
+Box propagation between detector keyframes.
+Moves the last detected boxes with sparse Lucas-Kanade optical flow
+"""
+
+import cv2
+import numpy as np
+
+
+class BoxPropagator:
+    """Shifts person boxes frame to frame by the median flow of points inside them"""
+
+    def __init__(self, points_per_box=8, min_points=3, max_fb_error=1.5):
+        self.points_per_box = points_per_box
+        self.min_points = min_points
+        self.max_fb_error = max_fb_error
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.prev_gray = None
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.points = np.zeros((0, 1, 2), dtype=np.float32)
+        self.owners = np.zeros(0, dtype=np.int32)
+
+    def reset(self, gray, boxes):
+        """Start tracking from a keyframe's detections"""
+        self.prev_gray = gray
+        self.boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        points, owners = [], []
+        for index, (x1, y1, x2, y2) in enumerate(self.boxes.astype(int)):
+            x1, y1 = max(x1, 0), max(y1, 0)
+            roi = gray[y1:y2, x1:x2]
+            if roi.size == 0:
+                continue
+            corners = cv2.goodFeaturesToTrack(roi, self.points_per_box, 0.01, 3)
+            if corners is None:
+                # Textureless box: fall back to a coarse grid
+                xs = np.linspace(x1, x2, 3, endpoint=False) + (x2 - x1) / 6
+                ys = np.linspace(y1, y2, 3, endpoint=False) + (y2 - y1) / 6
+                corners = np.array([[[x - x1, y - y1]] for y in ys for x in xs], dtype=np.float32)
+            corners = corners + np.array([x1, y1], dtype=np.float32)
+            points.append(corners)
+            owners.extend([index] * len(corners))
+
+        if points:
+            self.points = np.concatenate(points).astype(np.float32)
+        else:
+            self.points = np.zeros((0, 1, 2), dtype=np.float32)
+        self.owners = np.array(owners, dtype=np.int32)
+
+    def propagate(self, gray):
+        """Move boxes to the new frame; returns (boxes, confidence in [0, 1])"""
+        if self.prev_gray is None or len(self.boxes) == 0:
+            self.prev_gray = gray
+            return [], 1.0
+        if len(self.points) == 0:
+            self.prev_gray = gray
+            return self.boxes.astype(int).tolist(), 0.0
+
+        forward, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **self.lk_params)
+        backward, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, forward, None, **self.lk_params)
+        fb_error = np.linalg.norm((self.points - backward).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+        motion = (forward - self.points).reshape(-1, 2)
+        tracked_boxes = 0
+        for index in range(len(self.boxes)):
+            mask = good & (self.owners == index)
+            if np.count_nonzero(mask) >= self.min_points:
+                dx, dy = np.median(motion[mask], axis=0)
+                self.boxes[index] += (dx, dy, dx, dy)
+                tracked_boxes += 1
+
+        # Keep only the points that are still reliable for the next step
+        self.points = forward[good].reshape(-1, 1, 2)
+        self.owners = self.owners[good]
+        self.prev_gray = gray
+
+        confidence = tracked_boxes / len(self.boxes)
+        return self.boxes.astype(int).tolist(), confidence
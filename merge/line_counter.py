@@ -0,0 +1,115 @@
+"""
+Line-crossing counter for gates and ghat entries.
+Counts directional flow (in/out) across configured lines from tracker movements
+"""
+
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+class CountingLine:
+    """A directed counting line with cumulative totals and a rolling rate window"""
+
+    def __init__(self, name, start, end, window_seconds=60.0):
+        # Points are (x, y) as ratios of frame width/height, like the location zones
+        self.name = name
+        self.start = start
+        self.end = end
+        self.window_seconds = window_seconds
+        self.in_count = 0
+        self.out_count = 0
+        self.in_events = deque()
+        self.out_events = deque()
+        self.pixel_start = None
+        self.pixel_end = None
+
+    def scale(self, width, height):
+        """Convert the ratio endpoints to pixel coordinates for a frame size"""
+        self.pixel_start = (self.start[0] * width, self.start[1] * height)
+        self.pixel_end = (self.end[0] * width, self.end[1] * height)
+
+    def _side(self, point) -> int:
+        # Half-open sides (>= 0 is "in") so a centroid resting on the line is
+        # counted exactly once when it leaves it
+        (x1, y1), (x2, y2) = self.pixel_start, self.pixel_end
+        cross = (x2 - x1) * (point[1] - y1) - (y2 - y1) * (point[0] - x1)
+        return 1 if cross >= 0 else -1
+
+    def crossing(self, previous, current) -> int:
+        """Return +1 (in), -1 (out) or 0 for the segment previous -> current"""
+        side_before = self._side(previous)
+        side_after = self._side(current)
+        if side_before == side_after:
+            return 0
+
+        # The movement straddles the infinite line; make sure it passes
+        # between the endpoints rather than beside them
+        (x1, y1), (x2, y2) = self.pixel_start, self.pixel_end
+        dx, dy = current[0] - previous[0], current[1] - previous[1]
+        cross_a = dx * (y1 - previous[1]) - dy * (x1 - previous[0])
+        cross_b = dx * (y2 - previous[1]) - dy * (x2 - previous[0])
+        if (cross_a > 0 and cross_b > 0) or (cross_a < 0 and cross_b < 0):
+            return 0
+
+        return side_after
+
+    def record(self, direction, timestamp):
+        if direction > 0:
+            self.in_count += 1
+            self.in_events.append(timestamp)
+        else:
+            self.out_count += 1
+            self.out_events.append(timestamp)
+
+    def expire(self, now):
+        """Drop rate-window events older than the window"""
+        cutoff = now - self.window_seconds
+        for events in (self.in_events, self.out_events):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def stats(self) -> Dict:
+        per_minute = 60.0 / self.window_seconds
+        return {
+            'name': self.name,
+            'in_count': self.in_count,
+            'out_count': self.out_count,
+            'net_count': self.in_count - self.out_count,
+            'in_per_minute': round(len(self.in_events) * per_minute, 1),
+            'out_per_minute': round(len(self.out_events) * per_minute, 1),
+            'window_seconds': self.window_seconds
+        }
+
+
+class LineCounter:
+    """Counts crossings of all configured lines from tracker movements"""
+
+    def __init__(self, lines: Optional[List[CountingLine]] = None):
+        self.lines = lines or []
+        self.frame_size = None
+
+    def add_line(self, name, start, end, window_seconds=60.0) -> CountingLine:
+        line = CountingLine(name, start, end, window_seconds)
+        if self.frame_size is not None:
+            line.scale(*self.frame_size)
+        self.lines.append(line)
+        return line
+
+    def set_frame_size(self, width, height):
+        if self.frame_size == (width, height):
+            return
+        self.frame_size = (width, height)
+        for line in self.lines:
+            line.scale(width, height)
+
+    def update(self, movements: List[Tuple[int, Tuple, Tuple]], timestamp: float):
+        """Count crossings for this frame's (object_id, previous, current) movements"""
+        for line in self.lines:
+            for _, previous, current in movements:
+                direction = line.crossing(previous, current)
+                if direction != 0:
+                    line.record(direction, timestamp)
+            line.expire(timestamp)
+
+    def stats(self) -> List[Dict]:
+        return [line.stats() for line in self.lines]
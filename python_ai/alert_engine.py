@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Alert Engine - Crowd alert levels with hysteresis and dwell times per location
+Emits only level-transition events through an in-process event bus
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class EventBus:
+    """In-process pub/sub with sequence numbers for long-poll and SSE readers
+
+    Publishing works from any thread. Readers wait as asyncio tasks, so an
+    idle long-poll or SSE client holds no thread and is simply cancelled
+    when it disconnects.
+    """
+
+    def __init__(self, max_history: int = 1000):
+        self.history = deque(maxlen=max_history)
+        self.lock = threading.RLock()
+        self._sequence = itertools.count(1)
+        self.last_sequence = 0
+        # (event loop, asyncio.Event) of every waiting reader
+        self._waiters = set()
+
+    def publish(self, event_type: str, payload: Dict) -> Dict:
+        with self.lock:
+            self.last_sequence = next(self._sequence)
+            event = {**payload, 'sequence': self.last_sequence, 'type': event_type}
+            self.history.append(event)
+            waiters = list(self._waiters)
+
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        for loop, waiter in waiters:
+            if loop is current_loop:
+                waiter.set()
+            else:
+                try:
+                    loop.call_soon_threadsafe(waiter.set)
+                except RuntimeError:
+                    # The reader's loop has closed
+                    with self.lock:
+                        self._waiters.discard((loop, waiter))
+        return event
+
+    def events_since(self, sequence: int = 0, event_type: Optional[str] = None) -> List[Dict]:
+        with self.lock:
+            return [event for event in self.history
+                    if event['sequence'] > sequence and (event_type is None or event['type'] == event_type)]
+
+    async def wait_for_events(self, sequence: int = 0, timeout: float = 25.0,
+                              event_type: Optional[str] = None) -> List[Dict]:
+        """Wait until events newer than ``sequence`` exist or ``timeout`` passes"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self.lock:
+                events = self.events_since(sequence, event_type)
+                if events or loop.time() >= deadline:
+                    return events
+                # Skip past events of other types so we only wake for new ones
+                sequence = max(sequence, self.last_sequence)
+                waiter = asyncio.Event()
+                entry = (loop, waiter)
+                self._waiters.add(entry)
+            try:
+                await asyncio.wait_for(waiter.wait(), max(deadline - loop.time(), 0.0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self.lock:
+                    self._waiters.discard(entry)
+
+
+class LocationAlertState:
+    """Current and pending alert level for one location"""
+
+    __slots__ = ('level', 'pending', 'pending_since', 'changed_at')
+
+    def __init__(self):
+        self.level = None
+        self.pending = None
+        self.pending_since = None
+        self.changed_at = None
+
+
+class AlertEngine:
+    """Classifies a crowd metric into levels with hysteresis bands and minimum dwell times"""
+
+    def __init__(self,
+                 thresholds: Sequence[float] = (30, 60, 85),
+                 levels: Sequence[Tuple[str, str]] = (('LOW', 'SAFE'), ('MODERATE', 'CAUTION'),
+                                                      ('HIGH', 'WARNING'), ('CRITICAL', 'DANGER')),
+                 band: float = 5.0,
+                 dwell_up_seconds: float = 5.0,
+                 dwell_down_seconds: float = 30.0,
+                 event_bus: Optional[EventBus] = None):
+        # levels[i] is (crowd_level, alert_level) for values in [thresholds[i-1], thresholds[i])
+        self.thresholds = list(thresholds)
+        self.levels = list(levels)
+        self.defaults = {
+            'band': band,
+            'dwell_up_seconds': dwell_up_seconds,
+            'dwell_down_seconds': dwell_down_seconds
+        }
+        self.location_settings: Dict[str, Dict] = {}
+        self.event_bus = event_bus or EventBus()
+        self.states: Dict[str, LocationAlertState] = {}
+
+    def configure(self, location: str, **settings):
+        """Override band / dwell_up_seconds / dwell_down_seconds for one location"""
+        unknown = set(settings) - set(self.defaults)
+        if unknown:
+            raise ValueError(f"Unknown alert settings: {', '.join(sorted(unknown))}")
+        self.location_settings.setdefault(location, {}).update(settings)
+
+    def _settings(self, location: str) -> Dict:
+        return {**self.defaults, **self.location_settings.get(location, {})}
+
+    def classify(self, value: float) -> int:
+        """Level index for a value without hysteresis"""
+        level = 0
+        for threshold in self.thresholds:
+            if value >= threshold:
+                level += 1
+        return level
+
+    def current(self, location: str) -> Optional[Dict]:
+        state = self.states.get(location)
+        if state is None or state.level is None:
+            return None
+        crowd_level, alert_level = self.levels[state.level]
+        return {'location': location, 'crowd_level': crowd_level, 'alert_level': alert_level,
+                'since': state.changed_at}
+
+    def update(self, location: str, value: float, timestamp: Optional[float] = None,
+               details: Optional[Dict] = None) -> Optional[Dict]:
+        """Fold a new reading in; returns the published event if the level changed
+
+        The first reading for a location publishes an ``alert_initial`` event
+        with the starting level but returns None, so a restarted service or a
+        one-shot CLI run does not report every camera as escalating.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        settings = self._settings(location)
+        state = self.states.get(location)
+        if state is None:
+            state = LocationAlertState()
+            self.states[location] = state
+
+        if state.level is None:
+            self._transition(location, state, self.classify(value), value, timestamp, details)
+            return None
+
+        # Rising needs the plain threshold, falling needs to clear it by the band
+        rising = self.classify(value)
+        falling = self.classify(value + settings['band'])
+        if rising > state.level:
+            candidate = rising
+        elif falling < state.level:
+            candidate = falling
+        else:
+            state.pending = None
+            return None
+
+        if state.pending != candidate:
+            state.pending = candidate
+            state.pending_since = timestamp
+        dwell = settings['dwell_up_seconds'] if candidate > state.level else settings['dwell_down_seconds']
+        if timestamp - state.pending_since < dwell:
+            return None
+        return self._transition(location, state, candidate, value, timestamp, details)
+
+    def _transition(self, location, state, level, value, timestamp, details) -> Dict:
+        previous = state.level
+        state.level = level
+        state.pending = None
+        state.pending_since = None
+        state.changed_at = timestamp
+
+        crowd_level, alert_level = self.levels[level]
+        return self.event_bus.publish('alert_initial' if previous is None else 'alert_transition', {
+            'location': location,
+            'timestamp': timestamp,
+            'value': round(value, 1),
+            'crowd_level': crowd_level,
+            'alert_level': alert_level,
+            'previous_crowd_level': self.levels[previous][0] if previous is not None else None,
+            'previous_alert_level': self.levels[previous][1] if previous is not None else None,
+            'escalation': previous is not None and level > previous,
+            **(details or {})
+        })
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Analytics Store - Append-only columnar storage of per-frame crowd analytics
+Time-rotated segments of raw numpy columns, read back through memory maps by location and time range
+
+Usage: python analytics_store.py <store_dir> [location] [start_ts] [end_ts]
+"""
+
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+MAX_ZONES = 4
+
+# (column, dtype, per-row shape). Categorical columns hold codes into the store dictionary.
+SCHEMA = [
+    ('timestamp', '<f8', ()),
+    ('location', '<u2', ()),
+    ('total_persons', '<i4', ()),
+    ('zone_counts', '<i4', (MAX_ZONES,)),
+    ('density', '<f4', ()),
+    ('crowd_percentage', '<f4', ()),
+    ('crowd_level', '<u2', ()),
+    ('alert_level', '<u2', ())
+]
+CATEGORICAL = ('location', 'crowd_level', 'alert_level')
+SEGMENT_NAME = re.compile(r'^\d{8}T\d{6}$')
+UNSORTED_MARKER = 'unsorted'
+
+
+class SegmentWriter:
+    """Open column files of the segment currently being appended to"""
+
+    def __init__(self, path: str, dtype: np.dtype):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.rows = self._recover(dtype)
+        self.files = {name: open(os.path.join(path, f'{name}.bin'), 'ab') for name in dtype.names}
+        self.last_timestamp = float('-inf')
+        if self.rows:
+            timestamps = np.memmap(os.path.join(path, 'timestamp.bin'), dtype='<f8', mode='r', shape=(self.rows,))
+            self.last_timestamp = float(timestamps[-1])
+            del timestamps
+
+    def _recover(self, dtype: np.dtype) -> int:
+        """Row count of the segment, cutting off a partially written last row"""
+        rows = None
+        for name in dtype.names:
+            column = os.path.join(self.path, f'{name}.bin')
+            size = os.path.getsize(column) if os.path.exists(column) else 0
+            count = size // dtype[name].itemsize
+            rows = count if rows is None else min(rows, count)
+        for name in dtype.names:
+            column = os.path.join(self.path, f'{name}.bin')
+            if os.path.exists(column) and os.path.getsize(column) != rows * dtype[name].itemsize:
+                with open(column, 'r+b') as handle:
+                    handle.truncate(rows * dtype[name].itemsize)
+        return rows
+
+    def write(self, batch: np.ndarray):
+        if batch['timestamp'][0] < self.last_timestamp:
+            # Range reads fall back to a full scan of this segment's timestamps
+            open(os.path.join(self.path, UNSORTED_MARKER), 'a').close()
+        for name, handle in self.files.items():
+            handle.write(np.ascontiguousarray(batch[name]).tobytes())
+        for handle in self.files.values():
+            handle.flush()
+        self.rows += len(batch)
+        self.last_timestamp = max(self.last_timestamp, float(batch['timestamp'][-1]))
+
+    def close(self):
+        for handle in self.files.values():
+            handle.close()
+
+
+class AnalyticsStore:
+    """Append-only per-frame analytics store with one writer and memory-mapped readers
+
+    Rows are buffered in memory and appended to per-column ``.bin`` files of
+    the segment covering their timestamp. Segments rotate every
+    ``segment_seconds``; queries only map the segments overlapping the range.
+    """
+
+    def __init__(self, root: str, segment_seconds: int = 3600, buffer_rows: int = 256,
+                 flush_interval_seconds: float = 1.0):
+        self.root = root
+        self.dtype = np.dtype([(name, dtype, shape) for name, dtype, shape in SCHEMA])
+        os.makedirs(root, exist_ok=True)
+
+        self.meta_path = os.path.join(root, 'store.json')
+        created = not os.path.exists(self.meta_path)
+        if created:
+            meta = {'segment_seconds': segment_seconds, 'schema': [name for name, _, _ in SCHEMA],
+                    'dictionary': {column: [] for column in CATEGORICAL}}
+        else:
+            meta = self._read_meta()
+        # An existing store keeps the rotation it was created with
+        self.segment_seconds = meta['segment_seconds']
+        self.dictionary: Dict[str, List[str]] = meta['dictionary']
+        self.codes = {column: {value: code for code, value in enumerate(values)}
+                      for column, values in self.dictionary.items()}
+        # Metadata is only written on creation and when a new code is added, so
+        # read-only users never overwrite the live writer's dictionary
+        if created:
+            self._save_meta()
+
+        self.buffer = np.zeros(buffer_rows, dtype=self.dtype)
+        self.buffered = 0
+        self.flush_interval_seconds = flush_interval_seconds
+        self.last_flush = time.monotonic()
+        self.writers: Dict[str, SegmentWriter] = {}
+        self.lock = threading.RLock()
+
+    def _read_meta(self) -> Dict:
+        with open(self.meta_path) as handle:
+            meta = json.load(handle)
+        if meta['schema'] != [name for name, _, _ in SCHEMA]:
+            raise ValueError(f"Store at {self.root} uses a different schema: {meta['schema']}")
+        return meta
+
+    def _refresh_dictionary(self):
+        """Pick up codes another process (the writer) added since this store was opened"""
+        try:
+            saved = self._read_meta()['dictionary']
+        except (OSError, ValueError):
+            return
+        for column, values in saved.items():
+            # Codes are append-only, so a longer list on disk extends ours
+            if len(values) > len(self.dictionary[column]):
+                self.dictionary[column] = values
+                self.codes[column] = {value: code for code, value in enumerate(values)}
+
+    def _save_meta(self):
+        temp_path = self.meta_path + '.tmp'
+        with open(temp_path, 'w') as handle:
+            json.dump({'segment_seconds': self.segment_seconds,
+                       'schema': [name for name, _, _ in SCHEMA],
+                       'dictionary': self.dictionary}, handle)
+        os.replace(temp_path, self.meta_path)
+
+    def _code(self, column: str, value: Optional[str]) -> int:
+        value = '' if value is None else str(value)
+        code = self.codes[column].get(value)
+        if code is None:
+            code = len(self.dictionary[column])
+            self.dictionary[column].append(value)
+            self.codes[column][value] = code
+            self._save_meta()
+        return code
+
+    def _segment_name(self, timestamp: float) -> str:
+        start = int(timestamp // self.segment_seconds) * self.segment_seconds
+        return datetime.fromtimestamp(start, tz=timezone.utc).strftime('%Y%m%dT%H%M%S')
+
+    def _segment_start(self, name: str) -> float:
+        return datetime.strptime(name, '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc).timestamp()
+
+    # --- Writing ---
+
+    def append(self, location: str, total_persons: int, timestamp: Optional[float] = None,
+               zone_counts: Sequence[int] = (), density: float = 0.0, crowd_percentage: float = float('nan'),
+               crowd_level: Optional[str] = None, alert_level: Optional[str] = None):
+        """Buffer one frame's analytics; flushed by size or age
+
+        Missing zone counts are stored as -1 and a missing crowd percentage as NaN.
+        """
+        with self.lock:
+            row = self.buffer[self.buffered]
+            row['timestamp'] = time.time() if timestamp is None else timestamp
+            row['location'] = self._code('location', location)
+            row['total_persons'] = total_persons
+            zones = list(zone_counts)[:MAX_ZONES]
+            row['zone_counts'] = zones + [-1] * (MAX_ZONES - len(zones))
+            row['density'] = density
+            row['crowd_percentage'] = crowd_percentage
+            row['crowd_level'] = self._code('crowd_level', crowd_level)
+            row['alert_level'] = self._code('alert_level', alert_level)
+            self.buffered += 1
+
+            if (self.buffered == len(self.buffer)
+                    or time.monotonic() - self.last_flush >= self.flush_interval_seconds):
+                self.flush()
+
+    def flush(self):
+        """Append buffered rows to their segments"""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if self.buffered == 0:
+                return
+            batch = np.sort(self.buffer[:self.buffered], order='timestamp', kind='stable')
+            self.buffered = 0
+
+            starts = (batch['timestamp'] // self.segment_seconds).astype(np.int64)
+            boundaries = np.flatnonzero(np.diff(starts)) + 1
+            for part in np.split(batch, boundaries):
+                name = self._segment_name(float(part['timestamp'][0]))
+                writer = self.writers.get(name)
+                if writer is None:
+                    writer = SegmentWriter(os.path.join(self.root, name), self.dtype)
+                    self.writers[name] = writer
+                writer.write(part)
+
+            # Only keep the newest segments open for late rows
+            for name in sorted(self.writers)[:-2]:
+                self.writers.pop(name).close()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            for writer in self.writers.values():
+                writer.close()
+            self.writers.clear()
+
+    # --- Reading ---
+
+    def segments(self, start: Optional[float] = None, end: Optional[float] = None) -> List[str]:
+        """Segment names overlapping [start, end)"""
+        names = sorted(name for name in os.listdir(self.root) if SEGMENT_NAME.match(name))
+        selected = []
+        for name in names:
+            segment_start = self._segment_start(name)
+            if end is not None and segment_start >= end:
+                continue
+            if start is not None and segment_start + self.segment_seconds <= start:
+                continue
+            selected.append(name)
+        return selected
+
+    def _map_segment(self, name: str) -> Dict[str, np.memmap]:
+        path = os.path.join(self.root, name)
+        rows = min(os.path.getsize(os.path.join(path, f'{column}.bin')) // self.dtype[column].itemsize
+                   for column in self.dtype.names)
+        if rows == 0:
+            return {}
+        return {column: np.memmap(os.path.join(path, f'{column}.bin'), dtype=self.dtype[column].base,
+                                  mode='r', shape=(rows,) + self.dtype[column].shape)
+                for column in self.dtype.names}
+
+    def query(self, location: Optional[str] = None, start: Optional[float] = None,
+              end: Optional[float] = None, columns: Optional[Sequence[str]] = None,
+              decode: bool = True) -> Dict[str, np.ndarray]:
+        """Rows in [start, end) for one location (or all), as one array per column
+
+        Only the pages of the requested columns inside the time range are
+        touched. Categorical columns are decoded to strings unless ``decode``
+        is False.
+        """
+        columns = list(columns or self.dtype.names)
+        if 'timestamp' not in columns:
+            columns.insert(0, 'timestamp')
+        with self.lock:
+            self.flush()
+            self._refresh_dictionary()
+            location_code = self.codes['location'].get(location) if location is not None else None
+        if location is not None and location_code is None:
+            return {column: np.zeros((0,) + self.dtype[column].shape, dtype=self.dtype[column].base)
+                    for column in columns}
+
+        parts = {column: [] for column in columns}
+        for name in self.segments(start, end):
+            mapped = self._map_segment(name)
+            if not mapped:
+                continue
+            timestamps = mapped['timestamp']
+            if os.path.exists(os.path.join(self.root, name, UNSORTED_MARKER)):
+                mask = np.ones(len(timestamps), dtype=bool)
+                if start is not None:
+                    mask &= timestamps >= start
+                if end is not None:
+                    mask &= timestamps < end
+                rows = np.flatnonzero(mask)
+                rows = rows[np.argsort(timestamps[rows], kind='stable')]
+            else:
+                first = np.searchsorted(timestamps, start, side='left') if start is not None else 0
+                last = np.searchsorted(timestamps, end, side='left') if end is not None else len(timestamps)
+                rows = np.arange(first, last)
+            if location_code is not None and len(rows):
+                rows = rows[mapped['location'][rows] == location_code]
+            for column in columns:
+                parts[column].append(np.asarray(mapped[column][rows]))
+            del mapped, timestamps
+
+        result = {}
+        for column in columns:
+            base, shape = self.dtype[column].base, self.dtype[column].shape
+            values = np.concatenate(parts[column]) if parts[column] else np.zeros((0,) + shape, dtype=base)
+            if decode and column in CATEGORICAL:
+                values = np.asarray(self.dictionary[column], dtype=object)[values] if len(values) else \
+                    np.zeros(0, dtype=object)
+            result[column] = values
+        return result
+
+    def locations(self) -> List[str]:
+        return list(self.dictionary['location'])
+
+    def prune(self, before: float) -> List[str]:
+        """Delete segments that end at or before ``before``; returns their names"""
+        with self.lock:
+            self.flush()
+            removed = []
+            for name in self.segments(end=before):
+                if self._segment_start(name) + self.segment_seconds > before:
+                    continue
+                writer = self.writers.pop(name, None)
+                if writer is not None:
+                    writer.close()
+                shutil.rmtree(os.path.join(self.root, name))
+                removed.append(name)
+            return removed
+
+
+def main():
+    """Replay stored rows as JSON lines"""
+    if len(sys.argv) < 2:
+        print(json.dumps({'error': 'Usage: analytics_store.py <store_dir> [location] [start_ts] [end_ts]'}))
+        return
+
+    store = AnalyticsStore(sys.argv[1])
+    location = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != '-' else None
+    start = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    end = float(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    rows = store.query(location, start, end)
+    for index in range(len(rows['timestamp'])):
+        record = {column: values[index].tolist() if hasattr(values[index], 'tolist') else values[index]
+                  for column, values in rows.items()}
+        record['zone_counts'] = [count for count in record['zone_counts'] if count >= 0]
+        if record['crowd_percentage'] != record['crowd_percentage']:
+            record['crowd_percentage'] = None
+        print(json.dumps(record))
+
+
+if __name__ == '__main__':
+    main()
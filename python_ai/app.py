@@ -2,12 +2,32 @@
 from flask import Flask, request, jsonify
 import cv2
 import numpy as np
-from PIL import Image
-import io
 import base64
 import json
+from detectors import create_detector, load_location_detectors
 
 app = Flask(__name__)
+# Base64 JSON bodies above this are refused with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024
+
+# Person detector per location, by registry name; unknown locations use the default
+DEFAULT_DETECTOR = 'haar_body_face'
+location_detectors = load_location_detectors()
+detectors = {}
+
+def get_detector(location=None):
+    name = location_detectors.get(location, DEFAULT_DETECTOR)
+    if name not in detectors:
+        if name == 'haar_body_face':
+            # Same cascade settings this endpoint has always used
+            detectors[name] = create_detector(name, body_neighbors=4, face_neighbors=4,
+                                              min_body_size=(0, 0), min_face_size=(0, 0))
+        else:
+            detectors[name] = create_detector(name)
+    return detectors[name]
+
+# Build the default detector now so a bad configuration fails at startup
+get_detector()
 
 # Example: Simple crowd density estimation using OpenCV
 @app.route('/analyze-crowd', methods=['POST'])
@@ -17,20 +37,16 @@ def analyze_crowd():
         data = request.json
         image_data = base64.b64decode(data['image'])
         
-        # Convert to OpenCV format
-        image = Image.open(io.BytesIO(image_data))
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Simple people detection using Haar cascades
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        body_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_fullbody.xml')
+        # Decode straight to BGR without an intermediate PIL copy
+        cv_image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if cv_image is None:
+            return jsonify({"error": "Could not decode image"}), 400
         
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-        bodies = body_cascade.detectMultiScale(gray, 1.1, 4)
+        # People detection with the location's configured detector
+        people = get_detector(data.get('location')).detect(cv_image)
         
         # Estimate crowd density
-        people_count = max(len(faces), len(bodies))
+        people_count = len(people)
         
         if people_count < 5:
             density = "low"
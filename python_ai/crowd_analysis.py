@@ -9,20 +9,25 @@ import cv2
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 import json
+import os
 import sys
 import base64
 from io import BytesIO
 from PIL import Image
 import time
+import math
+from alert_engine import AlertEngine
+from detectors import (EdgeContourDetector, HaarFaceDetector, HOGDetector, create_detector,
+                       load_location_detectors, to_gray)
+from perspective import PerspectiveDensityEstimator
+
+# Format of the persisted stage_costs.json
+STAGE_COSTS_VERSION = 2
 
 class PersonCounter:
     """Advanced person counting using OpenCV and computer vision techniques"""
     
     def __init__(self):
-        # Initialize HOG descriptor for person detection
-        self.hog = cv2.HOGDescriptor()
-        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
-        
         # Detection parameters optimized for crowd scenarios
         self.detection_params = {
             'hit_threshold': 0.3,
@@ -31,40 +36,155 @@ class PersonCounter:
             'scale': 1.05
         }
         
+        # Stages of the default 'hog_fallback' detection chain
+        self.hog_detector = HOGDetector(**self.detection_params)
+        self.face_detector = HaarFaceDetector()
+        self.edge_detector = EdgeContourDetector()
+        
+        # Registry detectors used by locations configured with another 'detector'
+        self.detectors = {}
+        
         # Location-specific counting zones for different areas
         self.location_zones = {
             'ram_ghat': {
                 'name': 'Ram Ghat',
                 'zones': [(0.1, 0.2, 0.9, 0.8)],  # (x1, y1, x2, y2) as ratios
                 'capacity_threshold': 200,
-                'crowd_density_factor': 1.2
+                'crowd_density_factor': 1.2,
+                'detector': 'hog_fallback'
             },
             'mahakal_temple': {
                 'name': 'Mahakal Temple Entry',
                 'zones': [(0.2, 0.1, 0.8, 0.9)],
                 'capacity_threshold': 150,
-                'crowd_density_factor': 1.5
+                'crowd_density_factor': 1.5,
+                'detector': 'hog_fallback'
             },
             'triveni': {
                 'name': 'Triveni Sangam',
                 'zones': [(0.0, 0.1, 1.0, 0.9)],
                 'capacity_threshold': 300,
-                'crowd_density_factor': 1.0
+                'crowd_density_factor': 1.0,
+                'detector': 'hog_fallback'
             },
             'parking': {
                 'name': 'Parking Area',
                 'zones': [(0.1, 0.1, 0.9, 0.9)],
                 'capacity_threshold': 100,
-                'crowd_density_factor': 0.8
+                'crowd_density_factor': 0.8,
+                'detector': 'hog_fallback'
             }
         }
+        # Deployment overrides from location_detectors.json, shared with the other services
+        for location, detector_name in load_location_detectors().items():
+            if location in self.location_zones:
+                self.location_zones[location]['detector'] = detector_name
+        
+        # Crowd level thresholds on crowd_percentage, with hysteresis for alert events
+        self.alert_engine = AlertEngine()
+        
+        # Ground-plane calibrations turn box counts into people per square metre
+        self.perspective = PerspectiveDensityEstimator()
+        self.perspective.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'camera_calibrations.json'))
+        
+        # Degradation ladder for deadline-aware analysis, best quality first
+        self.analysis_strategies = [
+            {'name': 'full', 'max_width': 800, 'scale': 1.05, 'fallbacks': ('face', 'edges')},
+            {'name': 'balanced', 'max_width': 640, 'scale': 1.1, 'fallbacks': ('face',)},
+            {'name': 'fast', 'max_width': 480, 'scale': 1.2, 'fallbacks': ()},
+            {'name': 'minimal', 'max_width': 320, 'scale': 1.35, 'fallbacks': ()}
+        ]
+        
+        # Observed stage costs in ms per megapixel of the preprocessed frame (EWMA),
+        # seeded with priors measured on a 4-core x86 host. HOG is normalised to the
+        # default 1.05 pyramid step. The CLI runs once per frame, so learned costs are
+        # persisted between runs.
+        self.stage_costs = {'preprocess': 20.0, 'hog': 330.0, 'face': 1100.0, 'edges': 30.0}
+        self.stage_cost_smoothing = 0.2
+        # A single observation may raise an estimate at most this many times over
+        self.stage_cost_max_jump = 4.0
+        self.stage_costs_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stage_costs.json')
+        self._load_stage_costs()
+        
+        # OpenCV's first colour conversion pays a one-time ~100 ms initialisation;
+        # take it here so it is neither timed as preprocessing nor charged to a deadline
+        self.preprocess_frame(np.zeros((16, 16, 3), dtype=np.uint8))
+
+    def get_detector(self, name: str):
+        """Cached registry detector instance by name"""
+        if name not in self.detectors:
+            self.detectors[name] = create_detector(name)
+        return self.detectors[name]
+
+    def _hog_pyramid_factor(self, scale: float) -> float:
+        """Relative HOG cost of a pyramid step versus the default 1.05"""
+        return math.log(1.05) / math.log(scale)
+
+    def _load_stage_costs(self):
+        try:
+            with open(self.stage_costs_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Files from before costs were per preprocessed megapixel are ignored
+        if not isinstance(saved, dict) or saved.get('version') != STAGE_COSTS_VERSION:
+            return
+        for stage, cost in saved.get('costs', {}).items():
+            if stage in self.stage_costs and isinstance(cost, (int, float)) and cost > 0:
+                self.stage_costs[stage] = float(cost)
+
+    def save_stage_costs(self):
+        """Persist learned stage costs for the next process (atomic replace, last writer wins)"""
+        temp_path = f'{self.stage_costs_path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': STAGE_COSTS_VERSION, 'costs': self.stage_costs}, f)
+            os.replace(temp_path, self.stage_costs_path)
+        except OSError:
+            pass
 
-    def preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
+    def _record_stage_cost(self, stage: str, elapsed_ms: float, megapixels: float, factor: float = 1.0):
+        """Fold an observed stage timing into the per-megapixel cost estimate"""
+        if megapixels <= 0:
+            return
+        observed = min(elapsed_ms / (megapixels * factor), self.stage_costs[stage] * self.stage_cost_max_jump)
+        smoothing = self.stage_cost_smoothing
+        self.stage_costs[stage] = smoothing * observed + (1 - smoothing) * self.stage_costs[stage]
+
+    def estimate_strategy_cost(self, strategy: Dict, frame_shape: Tuple) -> float:
+        """Worst-case milliseconds for a strategy on a frame of the given shape"""
+        height, width = frame_shape[:2]
+        source_mp = (width * height) / 1e6
+        if width > strategy['max_width']:
+            ratio = strategy['max_width'] / width
+            megapixels = source_mp * ratio * ratio
+        else:
+            megapixels = source_mp
+        
+        cost = self.stage_costs['preprocess'] * megapixels
+        cost += self.stage_costs['hog'] * megapixels * self._hog_pyramid_factor(strategy['scale'])
+        for stage in strategy['fallbacks']:
+            cost += self.stage_costs[stage] * megapixels
+        return cost
+
+    def choose_strategy(self, frame_shape: Tuple, budget_ms: Optional[float]) -> Dict:
+        """Pick the best-quality strategy expected to fit the remaining budget"""
+        if budget_ms is None:
+            return self.analysis_strategies[0]
+        
+        for strategy in self.analysis_strategies:
+            if self.estimate_strategy_cost(strategy, frame_shape) <= budget_ms:
+                return strategy
+        
+        # Nothing fits: answer as coarsely and quickly as possible
+        return self.analysis_strategies[-1]
+
+    def preprocess_frame(self, frame: np.ndarray, max_width: int = 800) -> np.ndarray:
         """Preprocess frame for optimal person detection"""
         # Resize for faster processing while maintaining accuracy
         height, width = frame.shape[:2]
-        if width > 800:
-            scale = 800 / width
+        if width > max_width:
+            scale = max_width / width
             new_width = int(width * scale)
             new_height = int(height * scale)
             frame = cv2.resize(frame, (new_width, new_height))
@@ -79,63 +199,67 @@ class PersonCounter:
         
         return frame
 
-    def detect_persons_advanced(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
-        """Advanced person detection using multiple methods"""
+    def detect_persons_advanced(self,
+                                frame: np.ndarray,
+                                scale: Optional[float] = None,
+                                fallbacks: Tuple[str, ...] = ('face', 'edges'),
+                                deadline: Optional[float] = None,
+                                stage_log: Optional[Dict] = None) -> List[Tuple[int, int, int, int]]:
+        """Advanced person detection using multiple methods
+        
+        ``scale`` overrides the HOG pyramid step, ``fallbacks`` limits which
+        fallback detectors may run and ``deadline`` (a ``time.perf_counter``
+        value) skips any fallback that would start after it. Stages run and
+        skipped are recorded into ``stage_log`` when given.
+        """
+        if stage_log is None:
+            stage_log = {}
+        stage_log.setdefault('stages_run', [])
+        stage_log.setdefault('stages_skipped', [])
+        
+        def can_run(stage):
+            if stage not in fallbacks:
+                return False
+            if deadline is not None and time.perf_counter() >= deadline:
+                stage_log['stages_skipped'].append(stage)
+                return False
+            return True
+        
         try:
             # Convert to grayscale for HOG detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray = to_gray(frame)
+            megapixels = (gray.shape[0] * gray.shape[1]) / 1e6
             
             # Method 1: HOG descriptor (primary)
-            boxes, weights = self.hog.detectMultiScale(
-                gray,
-                **self.detection_params
-            )
-            
+            hog_scale = scale or self.detection_params['scale']
+            started = time.perf_counter()
+            boxes = self.hog_detector.detect(gray, scale=hog_scale)
+            self._record_stage_cost('hog', (time.perf_counter() - started) * 1000, megapixels,
+                                    self._hog_pyramid_factor(hog_scale))
+            stage_log['stages_run'].append('hog')
             if len(boxes) > 0:
-                boxes = np.array([[x, y, x + w, y + h] for (x, y, w, h) in boxes])
-                keep = cv2.dnn.NMSBoxes(
-                    boxes.tolist(),
-                    weights.tolist(),
-                    score_threshold=0.3,
-                    nms_threshold=0.4
-                )
-                
-                if len(keep) > 0:
-                    boxes = boxes[keep.flatten()]
-                    return boxes.tolist()
+                return boxes
             
             # Method 2: Face detection fallback
-            try:
-                face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-                if len(faces) > 0:
-                    # Convert face detections to person boxes (approximate)
-                    person_boxes = []
-                    for (x, y, w, h) in faces:
-                        # Estimate person body from face
-                        person_h = int(h * 6)  # Approximate body height
-                        person_w = int(w * 2)  # Approximate body width
-                        person_y = max(0, y - int(h * 0.2))  # Start slightly above face
-                        person_x = max(0, x - int(w * 0.5))  # Center on face
-                        person_boxes.append([person_x, person_y, person_x + person_w, person_y + person_h])
-                    return person_boxes
-            except:
-                pass
+            if can_run('face'):
+                try:
+                    started = time.perf_counter()
+                    person_boxes = self.face_detector.detect(gray)
+                    self._record_stage_cost('face', (time.perf_counter() - started) * 1000, megapixels)
+                    stage_log['stages_run'].append('face')
+                    if len(person_boxes) > 0:
+                        return person_boxes
+                except:
+                    pass
             
             # Method 3: Edge-based estimation
-            edges = cv2.Canny(gray, 50, 150)
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            person_like_contours = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if 1000 < area < 10000:  # Size filter for person-like objects
-                    x, y, w, h = cv2.boundingRect(contour)
-                    aspect_ratio = h / w if w > 0 else 0
-                    if 1.5 < aspect_ratio < 4:  # Aspect ratio filter for standing people
-                        person_like_contours.append([x, y, x + w, y + h])
-            
-            return person_like_contours[:20]  # Limit to reasonable number
+            if not can_run('edges'):
+                return []
+            started = time.perf_counter()
+            person_like_contours = self.edge_detector.detect(gray)
+            self._record_stage_cost('edges', (time.perf_counter() - started) * 1000, megapixels)
+            stage_log['stages_run'].append('edges')
+            return person_like_contours
             
         except Exception as e:
             print(f"Detection error: {e}", file=sys.stderr)
@@ -146,9 +270,18 @@ class PersonCounter:
         height, width = frame_shape[:2]
         location_config = self.location_zones.get(location, self.location_zones['ram_ghat'])
         
+        total_persons = len(person_boxes)
+        
+        # Calibrated cameras: foot-point lookup into cached ground-area zone maps
+        perspective = self.perspective.density(location, person_boxes, frame_shape, location_config['zones'])
+        if perspective is not None:
+            return self._crowd_metrics(location_config, total_persons, perspective['zone_counts'],
+                                       perspective['density'], 'persons_per_m2',
+                                       zone_density=perspective['zone_density'],
+                                       ground_area_m2=perspective['ground_area_m2'])
+        
         # Count persons in defined zones
         zone_counts = []
-        total_persons = len(person_boxes)
         
         for zone in location_config['zones']:
             x1, y1, x2, y2 = zone
@@ -172,36 +305,38 @@ class PersonCounter:
         # Apply location-specific density factor
         adjusted_density = density * location_config['crowd_density_factor']
         
+        return self._crowd_metrics(location_config, total_persons, zone_counts,
+                                   round(adjusted_density, 2), 'relative')
+    
+    def _crowd_metrics(self, location_config: Dict, total_persons: int, zone_counts: List,
+                       density: float, density_unit: str, **extra) -> Dict:
         # Determine crowd level
         capacity = location_config['capacity_threshold']
         crowd_percentage = min((total_persons / capacity) * 100, 100)
-        
-        if crowd_percentage < 30:
-            crowd_level = 'LOW'
-            alert_level = 'SAFE'
-        elif crowd_percentage < 60:
-            crowd_level = 'MODERATE'
-            alert_level = 'CAUTION'
-        elif crowd_percentage < 85:
-            crowd_level = 'HIGH'
-            alert_level = 'WARNING'
-        else:
-            crowd_level = 'CRITICAL'
-            alert_level = 'DANGER'
+        crowd_level, alert_level = self.alert_engine.levels[self.alert_engine.classify(crowd_percentage)]
         
         return {
             'total_persons': total_persons,
             'zone_counts': zone_counts,
-            'density': round(adjusted_density, 2),
+            'density': density,
+            'density_unit': density_unit,
             'crowd_level': crowd_level,
             'crowd_percentage': round(crowd_percentage, 1),
             'alert_level': alert_level,
             'capacity': capacity,
-            'location_name': location_config['name']
+            'location_name': location_config['name'],
+            **extra
         }
 
-    def analyze_frame(self, frame_data: str, location: str = 'ram_ghat') -> Dict:
-        """Analyze a single frame for person counting"""
+    def analyze_frame(self, frame_data: str, location: str = 'ram_ghat',
+                      deadline_ms: Optional[float] = None) -> Dict:
+        """Analyze a single frame for person counting
+        
+        With ``deadline_ms`` the resolution, HOG pyramid step and fallback
+        detectors are chosen from observed stage costs so the answer arrives
+        within budget, coarser if necessary.
+        """
+        started = time.perf_counter()
         try:
             # Decode base64 image
             if ',' in frame_data:
@@ -211,11 +346,70 @@ class PersonCounter:
             image = Image.open(BytesIO(image_bytes))
             frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
             
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'analysis': {
+                    'total_persons': 0,
+                    'crowd_level': 'UNKNOWN',
+                    'alert_level': 'ERROR'
+                }
+            }
+        
+        return self.analyze_image(frame, location, deadline_ms, started)
+
+    def analyze_image(self, frame: np.ndarray, location: str = 'ram_ghat',
+                      deadline_ms: Optional[float] = None, started: Optional[float] = None,
+                      update_state: bool = True) -> Dict:
+        """Analyze an already decoded BGR frame for person counting
+        
+        The frame is only read, so it may be a view into shared memory.
+        ``started`` is the ``time.perf_counter`` value the deadline counts from.
+        With ``update_state`` False only detection runs; the caller is expected
+        to pass the analysis to ``update_location_state`` in a single process.
+        """
+        if started is None:
+            started = time.perf_counter()
+        deadline = started + deadline_ms / 1000 if deadline_ms is not None else None
+        try:
+            # Choose a strategy for whatever budget is left after decoding
+            budget_ms = None
+            if deadline is not None:
+                budget_ms = (deadline - time.perf_counter()) * 1000
+            strategy = self.choose_strategy(frame.shape, budget_ms)
+            
             # Preprocess frame
-            processed_frame = self.preprocess_frame(frame)
+            preprocess_started = time.perf_counter()
+            processed_frame = self.preprocess_frame(frame, strategy['max_width'])
+            self._record_stage_cost('preprocess', (time.perf_counter() - preprocess_started) * 1000,
+                                    (processed_frame.shape[0] * processed_frame.shape[1]) / 1e6)
             
-            # Detect persons
-            person_boxes = self.detect_persons_advanced(processed_frame)
+            # Detect persons with the location's configured detector
+            location_config = self.location_zones.get(location, self.location_zones['ram_ghat'])
+            detector_name = location_config.get('detector', 'hog_fallback')
+            stage_log = {}
+            # Only what the detector actually applies is reported with the strategy;
+            # other detectors get the deadline solely through the chosen max_width
+            applied_scale, applied_fallbacks, applied_deadline_ms = None, (), None
+            if detector_name == 'hog_fallback':
+                applied_scale, applied_fallbacks = strategy['scale'], strategy['fallbacks']
+                applied_deadline_ms = deadline_ms
+                person_boxes = self.detect_persons_advanced(
+                    processed_frame,
+                    scale=applied_scale,
+                    fallbacks=applied_fallbacks,
+                    deadline=deadline,
+                    stage_log=stage_log
+                )
+            else:
+                detector = self.get_detector(detector_name)
+                if isinstance(detector, HOGDetector):
+                    applied_scale = strategy['scale']
+                    person_boxes = detector.detect(processed_frame, scale=applied_scale)
+                else:
+                    person_boxes = detector.detect(processed_frame)
+                stage_log = {'stages_run': [detector_name], 'stages_skipped': []}
             
             # Calculate crowd metrics
             crowd_metrics = self.calculate_crowd_density(
@@ -230,8 +424,21 @@ class PersonCounter:
                 'frame_width': processed_frame.shape[1],
                 'frame_height': processed_frame.shape[0],
                 'processing_time': time.time(),
-                'location': location
+                'location': location,
+                'detector': detector_name,
+                'strategy': {
+                    'name': strategy['name'],
+                    'max_width': strategy['max_width'],
+                    'scale': applied_scale,
+                    'fallbacks': list(applied_fallbacks),
+                    'stages_run': stage_log['stages_run'],
+                    'stages_skipped': stage_log['stages_skipped'],
+                    'deadline_ms': applied_deadline_ms,
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+                }
             })
+            if update_state:
+                self.update_location_state(crowd_metrics)
             
             return {
                 'success': True,
@@ -249,6 +456,24 @@ class PersonCounter:
                 }
             }
 
+    def update_location_state(self, analysis: Dict, timestamp: Optional[float] = None) -> Dict:
+        """Feed one frame's analysis to the alert engine
+        
+        Adds 'stable_alert' and 'alert_event' to ``analysis``. Forecasts and
+        occupancy heatmaps need a history this one-process-per-frame CLI never
+        has, so they are left to long-running hosts (ai_service, the frame ring).
+        """
+        location = analysis['location']
+        
+        # Hysteresis-filtered alert level; alert_event is set only on a level change
+        alert_event = self.alert_engine.update(location, analysis['crowd_percentage'], timestamp,
+                                               details={'total_persons': analysis['total_persons']})
+        analysis.update({
+            'stable_alert': self.alert_engine.current(location),
+            'alert_event': alert_event
+        })
+        return analysis
+
     def process_video_feed(self, video_source: str, location: str = 'ram_ghat') -> Dict:
         """Process video feed for continuous monitoring"""
         try:
@@ -271,19 +496,8 @@ class PersonCounter:
             # Calculate metrics
             capacity = location_config['capacity_threshold']
             crowd_percentage = min((person_count / capacity) * 100, 100)
-            
-            if crowd_percentage < 30:
-                crowd_level = 'LOW'
-                alert_level = 'SAFE'
-            elif crowd_percentage < 60:
-                crowd_level = 'MODERATE'
-                alert_level = 'CAUTION'
-            elif crowd_percentage < 85:
-                crowd_level = 'HIGH'
-                alert_level = 'WARNING'
-            else:
-                crowd_level = 'CRITICAL'
-                alert_level = 'DANGER'
+            crowd_level, alert_level = self.alert_engine.levels[self.alert_engine.classify(crowd_percentage)]
+            alert_event = self.alert_engine.update(location, crowd_percentage, details={'total_persons': person_count})
             
             return {
                 'success': True,
@@ -296,7 +510,9 @@ class PersonCounter:
                     'location_name': location_config['name'],
                     'location': location,
                     'timestamp': time.time(),
-                    'feed_status': 'ACTIVE'
+                    'feed_status': 'ACTIVE',
+                    'stable_alert': self.alert_engine.current(location),
+                    'alert_event': alert_event
                 }
             }
             
@@ -352,13 +568,15 @@ def main():
     
     if command == 'analyze_frame':
         if len(sys.argv) < 3:
-            print(json.dumps({'error': 'Usage: analyze_frame <base64_image> [location]'}))
+            print(json.dumps({'error': 'Usage: analyze_frame <base64_image> [location] [deadline_ms]'}))
             return
         
         frame_data = sys.argv[2]
         location = sys.argv[3] if len(sys.argv) > 3 else 'ram_ghat'
-        result = counter.analyze_frame(frame_data, location)
+        deadline_ms = float(sys.argv[4]) if len(sys.argv) > 4 else None
+        result = counter.analyze_frame(frame_data, location, deadline_ms)
         print(json.dumps(result))
+        counter.save_stage_costs()
     
     elif command == 'process_feed':
         location = sys.argv[2] if len(sys.argv) > 2 else 'ram_ghat'
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Crowd Forecasting - Online per-location crowd level prediction for Mahakumbh 2028
+Damped-trend exponential smoothing with a time-of-day seasonal profile
+"""
+
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+
+class LocationForecastState:
+    """Smoothed level, trend and seasonal profile for one location"""
+
+    __slots__ = ('level', 'trend', 'seasonal', 'last_timestamp', 'capacity', 'observations')
+
+    def __init__(self, season_bins: int, capacity: int):
+        self.level = 0.0
+        self.trend = 0.0  # persons per minute
+        self.seasonal = [0.0] * season_bins
+        self.last_timestamp = None
+        self.capacity = capacity
+        self.observations = 0
+
+
+class CrowdForecaster:
+    """Online crowd count forecaster with O(1) state updates per observation
+
+    Smoothing is defined by time constants rather than per-observation
+    factors, so a camera feeding 25 frames per second and one polled every
+    few seconds converge to the same level and trend.
+    """
+
+    def __init__(self,
+                 level_minutes: float = 2.0,
+                 trend_minutes: float = 10.0,
+                 season_minutes: float = 60.0,
+                 damping: float = 0.95,
+                 season_bins: int = 96,
+                 horizons_minutes: Tuple[int, ...] = (5, 15, 30)):
+        # Time constants for level, trend and time-of-day profile smoothing
+        self.level_minutes = level_minutes
+        self.trend_minutes = trend_minutes
+        self.season_minutes = season_minutes
+        # Per-minute trend damping keeps 30 minute forecasts from running away
+        self.damping = damping
+        self.season_bins = season_bins
+        self.bin_seconds = 86400 / season_bins
+        self.horizons_minutes = horizons_minutes
+        self.states: Dict[str, LocationForecastState] = {}
+
+    def _season_bin(self, timestamp: float) -> int:
+        local = time.localtime(timestamp)
+        seconds = local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec
+        return int(seconds // self.bin_seconds) % self.season_bins
+
+    @staticmethod
+    def _gain(elapsed_minutes: float, time_constant: float) -> float:
+        """Smoothing weight of a new observation after ``elapsed_minutes``"""
+        return 1.0 - math.exp(-elapsed_minutes / time_constant)
+
+    def _damped_steps(self, minutes: float) -> float:
+        """Sum of damping**i for i in 1..minutes (closed form)"""
+        phi = self.damping
+        if phi >= 1.0:
+            return minutes
+        return phi * (1 - phi ** minutes) / (1 - phi)
+
+    def update(self, location: str, count: int, capacity: int, timestamp: Optional[float] = None):
+        """Fold one observed count into the location's smoothed state"""
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self.states.get(location)
+        if state is None:
+            state = LocationForecastState(self.season_bins, capacity)
+            self.states[location] = state
+        state.capacity = capacity
+
+        season_index = self._season_bin(timestamp)
+        season = state.seasonal[season_index]
+
+        if state.last_timestamp is None:
+            state.level = count - season
+        else:
+            elapsed_minutes = max((timestamp - state.last_timestamp) / 60.0, 0.0)
+            if elapsed_minutes == 0:
+                # Same-instant readings only nudge the level
+                elapsed_minutes = 1e-3
+            alpha = self._gain(elapsed_minutes, self.level_minutes)
+            beta = self._gain(elapsed_minutes, self.trend_minutes)
+            gamma = self._gain(elapsed_minutes, self.season_minutes)
+            
+            projected = state.level + state.trend * self._damped_steps(elapsed_minutes)
+            previous_level = state.level
+            state.level = alpha * (count - season) + (1 - alpha) * projected
+            # beta ~ elapsed / trend_minutes, so short intervals cannot amplify noise
+            observed_trend = (state.level - previous_level) / elapsed_minutes
+            state.trend = beta * observed_trend + (1 - beta) * state.trend
+            state.seasonal[season_index] = gamma * (count - state.level) + (1 - gamma) * season
+
+        state.last_timestamp = timestamp
+        state.observations += 1
+
+    def predict(self, location: str) -> Optional[Dict]:
+        """Predicted count and crowd_percentage at each horizon for one location"""
+        state = self.states.get(location)
+        if state is None:
+            return None
+
+        predictions = {}
+        for minutes in self.horizons_minutes:
+            target = state.last_timestamp + minutes * 60
+            count = state.level + state.trend * self._damped_steps(minutes)
+            count += state.seasonal[self._season_bin(target)]
+            count = max(count, 0.0)
+            crowd_percentage = min((count / state.capacity) * 100, 100) if state.capacity else 0.0
+            predictions[f'{minutes}m'] = {
+                'predicted_persons': int(round(count)),
+                'crowd_percentage': round(crowd_percentage, 1)
+            }
+
+        return {
+            'location': location,
+            'based_on': state.last_timestamp,
+            'observations': state.observations,
+            'trend_per_minute': round(state.trend, 2),
+            'predictions': predictions
+        }
+
+    def predict_all(self) -> Dict[str, Dict]:
+        """Predictions for every location seen so far"""
+        return {location: self.predict(location) for location in self.states}
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Person Detectors - Common detector interface and registry for Drishti services
+Every detector takes a BGR (or grayscale) frame and returns [x1, y1, x2, y2] boxes
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence
+
+# name -> detector class; populated by @register_detector
+DETECTOR_REGISTRY: Dict[str, Callable[..., 'PersonDetector']] = {}
+
+
+def register_detector(name: str):
+    """Class decorator adding a detector to the registry under ``name``"""
+    def decorator(cls):
+        cls.name = name
+        DETECTOR_REGISTRY[name] = cls
+        return cls
+    return decorator
+
+
+def create_detector(name: str, **params) -> 'PersonDetector':
+    """Instantiate a registered detector by name"""
+    if name not in DETECTOR_REGISTRY:
+        raise KeyError(f"Unknown detector '{name}'. Available: {', '.join(sorted(DETECTOR_REGISTRY))}")
+    return DETECTOR_REGISTRY[name](**params)
+
+
+def available_detectors() -> List[str]:
+    return sorted(DETECTOR_REGISTRY)
+
+
+# Shared per-location detector choice for every service, e.g. {"ram_ghat": "hog", "parking": "haar_face"}
+LOCATION_DETECTORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'location_detectors.json')
+
+
+def load_location_detectors(path: str = LOCATION_DETECTORS_PATH) -> Dict[str, str]:
+    """Location -> detector name from a JSON file (empty if missing)
+
+    Unknown detector names raise ValueError so a misconfigured service
+    fails at startup rather than on the first frame from that camera.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    if not isinstance(mapping, dict):
+        raise ValueError(f"{path} must map location names to detector names")
+    unknown = {location: name for location, name in mapping.items() if name not in DETECTOR_REGISTRY}
+    if unknown:
+        raise ValueError(f"Unknown detectors in {path}: {unknown}. Available: {', '.join(available_detectors())}")
+    return dict(mapping)
+
+
+def to_gray(frame: np.ndarray) -> np.ndarray:
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def load_cascade(filename: str) -> Optional[cv2.CascadeClassifier]:
+    """Load a bundled Haar cascade, or None when it is unavailable"""
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + filename)
+    if cascade.empty():
+        return None
+    return cascade
+
+
+class PersonDetector:
+    """Base class for person detectors"""
+
+    name = 'base'
+
+    def detect(self, frame: np.ndarray) -> List[List[int]]:
+        raise NotImplementedError
+
+
+@register_detector('hog')
+class HOGDetector(PersonDetector):
+    """OpenCV HOG + linear SVM pedestrian detector with optional NMS"""
+
+    def __init__(self, hit_threshold: float = 0.3, win_stride=(8, 8), padding=(8, 8),
+                 scale: float = 1.05, nms: bool = True):
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        self.hit_threshold = hit_threshold
+        self.win_stride = win_stride
+        self.padding = padding
+        self.scale = scale
+        self.nms = nms
+
+    def detect(self, frame: np.ndarray, scale: Optional[float] = None) -> List[List[int]]:
+        boxes, weights = self.hog.detectMultiScale(
+            to_gray(frame),
+            hitThreshold=self.hit_threshold,
+            winStride=self.win_stride,
+            padding=self.padding,
+            scale=scale or self.scale
+        )
+        if len(boxes) == 0:
+            return []
+
+        boxes = np.array([[x, y, x + w, y + h] for (x, y, w, h) in boxes])
+        if not self.nms:
+            return boxes.tolist()
+
+        keep = cv2.dnn.NMSBoxes(
+            boxes.tolist(),
+            np.asarray(weights).flatten().tolist(),
+            score_threshold=0.3,
+            nms_threshold=0.4
+        )
+        if len(keep) == 0:
+            return []
+        return boxes[np.asarray(keep).flatten()].tolist()
+
+
+@register_detector('haar_face')
+class HaarFaceDetector(PersonDetector):
+    """Frontal-face Haar cascade with person boxes extrapolated from each face"""
+
+    def __init__(self, scale_factor: float = 1.1, min_neighbors: int = 4, min_size=(0, 0)):
+        self.cascade = load_cascade('haarcascade_frontalface_default.xml')
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect_faces(self, frame: np.ndarray):
+        if self.cascade is None:
+            return []
+        return self.cascade.detectMultiScale(
+            to_gray(frame),
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=self.min_size
+        )
+
+    def detect(self, frame: np.ndarray) -> List[List[int]]:
+        person_boxes = []
+        for (x, y, w, h) in self.detect_faces(frame):
+            x, y, w, h = int(x), int(y), int(w), int(h)
+            # Estimate person body from face
+            person_h = int(h * 6)  # Approximate body height
+            person_w = int(w * 2)  # Approximate body width
+            person_y = max(0, y - int(h * 0.2))  # Start slightly above face
+            person_x = max(0, x - int(w * 0.5))  # Center on face
+            person_boxes.append([person_x, person_y, person_x + person_w, person_y + person_h])
+        return person_boxes
+
+
+@register_detector('edge_contours')
+class EdgeContourDetector(PersonDetector):
+    """Canny contours filtered by area and standing-person aspect ratio"""
+
+    def __init__(self, min_area: int = 1000, max_area: int = 10000, max_boxes: int = 20):
+        self.min_area = min_area
+        self.max_area = max_area
+        self.max_boxes = max_boxes
+
+    def detect(self, frame: np.ndarray) -> List[List[int]]:
+        edges = cv2.Canny(to_gray(frame), 50, 150)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        person_like_contours = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if self.min_area < area < self.max_area:  # Size filter for person-like objects
+                x, y, w, h = cv2.boundingRect(contour)
+                aspect_ratio = h / w if w > 0 else 0
+                if 1.5 < aspect_ratio < 4:  # Aspect ratio filter for standing people
+                    person_like_contours.append([x, y, x + w, y + h])
+
+        return person_like_contours[:self.max_boxes]
+
+
+@register_detector('haar_body_face')
+class HaarBodyFaceDetector(PersonDetector):
+    """Full-body and face Haar cascades; whichever finds more people wins"""
+
+    def __init__(self, scale_factor: float = 1.1, body_neighbors: int = 3, face_neighbors: int = 5,
+                 min_body_size=(30, 30), min_face_size=(20, 20)):
+        self.body_cascade = load_cascade('haarcascade_fullbody.xml')
+        self.face_detector = HaarFaceDetector(scale_factor, face_neighbors, min_face_size)
+        self.scale_factor = scale_factor
+        self.body_neighbors = body_neighbors
+        self.min_body_size = min_body_size
+
+    def detect(self, frame: np.ndarray) -> List[List[int]]:
+        gray = to_gray(frame)
+        bodies = []
+        if self.body_cascade is not None:
+            detections = self.body_cascade.detectMultiScale(
+                gray,
+                scaleFactor=self.scale_factor,
+                minNeighbors=self.body_neighbors,
+                minSize=self.min_body_size
+            )
+            bodies = [[int(x), int(y), int(x + w), int(y + h)] for (x, y, w, h) in detections]
+        faces = self.face_detector.detect(gray)
+        return bodies if len(bodies) >= len(faces) else faces
+
+
+@register_detector('hog_fallback')
+class FallbackChainDetector(PersonDetector):
+    """Runs detectors in order and returns the first non-empty result"""
+
+    def __init__(self, stages: Sequence[str] = ('hog', 'haar_face', 'edge_contours')):
+        self.stages = [create_detector(stage) for stage in stages]
+
+    def detect(self, frame: np.ndarray) -> List[List[int]]:
+        gray = to_gray(frame)
+        for stage in self.stages:
+            boxes = stage.detect(gray)
+            if len(boxes) > 0:
+                return boxes
+        return []
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Frame Ring - Zero-copy shared-memory frame handoff between decoder and detector processes
+Fixed-size frame slots with sequence numbers; the oldest frame is overwritten so live feeds never queue up
+
+Usage: python frame_ring.py <video_source> [location] [workers] [analytics_dir]
+"""
+
+import heapq
+import json
+import os
+import sys
+import time
+import uuid
+from multiprocessing import Event, Lock, Process, Queue, shared_memory
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from analytics_store import AnalyticsStore
+from crowd_forecast import CrowdForecaster
+
+# Header: [write_seq, claimed_seq, write_slot, slots, max_height, max_width, channels]
+# then per slot [seq, height, width, channels, pins] as int64, then per-slot
+# float64 timestamps, then the 64-byte aligned frame data
+HEADER_FIELDS = 7
+SLOT_FIELDS = 5
+DATA_ALIGNMENT = 64
+WRITING = -1
+
+
+class FrameRing:
+    """Shared-memory ring of frame slots written by one decoder, read by many workers
+
+    Readers get numpy views straight into the slots. A claimed slot is pinned
+    until released, and the writer overwrites the oldest unpinned slot, so a
+    view stays intact while a worker runs detection on it.
+    """
+
+    def __init__(self, name: str, lock, slots: int = 8, max_shape: Tuple[int, int, int] = (1080, 1920, 3),
+                 create: bool = False):
+        self.lock = lock
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(max_shape))
+        meta_bytes = 8 * (HEADER_FIELDS + slots * SLOT_FIELDS + slots)
+        data_offset = -(-meta_bytes // DATA_ALIGNMENT) * DATA_ALIGNMENT
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create,
+                                              size=data_offset + self.slot_bytes * slots if create else 0)
+        self.name = self.shm.name
+        self.owner = create
+
+        buffer = self.shm.buf
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        self.slot_meta = np.ndarray((slots, SLOT_FIELDS), dtype=np.int64, buffer=buffer,
+                                    offset=8 * HEADER_FIELDS)
+        self.timestamps = np.ndarray((slots,), dtype=np.float64, buffer=buffer,
+                                     offset=8 * (HEADER_FIELDS + slots * SLOT_FIELDS))
+        self.data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=buffer,
+                               offset=data_offset)
+
+        if create:
+            self.header[:] = (0, 0, slots - 1, slots, *max_shape)
+            self.slot_meta[:] = 0
+
+    @classmethod
+    def attach(cls, name: str, lock) -> 'FrameRing':
+        """Attach to an existing ring, reading its geometry from the header"""
+        probe = shared_memory.SharedMemory(name=name)
+        try:
+            header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=probe.buf)
+            slots, height, width, channels = (int(value) for value in header[3:])
+            del header
+        finally:
+            probe.close()
+        return cls(name, lock, slots, (height, width, channels))
+
+    def _view(self, slot: int) -> np.ndarray:
+        height, width, channels = (int(value) for value in self.slot_meta[slot, 1:4])
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        return self.data[slot, :height * width * channels].reshape(shape)
+
+    # --- Writer side ---
+
+    def acquire(self, shape: Tuple[int, ...]) -> Tuple[int, np.ndarray]:
+        """Take the oldest unpinned slot for a frame of ``shape``; returns (seq, writable view)"""
+        if int(np.prod(shape)) > self.slot_bytes:
+            raise ValueError(f"Frame {shape} does not fit slot size {self.max_shape}")
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+
+        with self.lock:
+            slot = int(self.header[2])
+            for _ in range(self.slots):
+                slot = (slot + 1) % self.slots
+                if self.slot_meta[slot, 4] == 0:
+                    break
+            else:
+                raise RuntimeError("All frame slots are pinned; use more slots than workers")
+            seq = int(self.header[0]) + 1
+            self.header[2] = slot
+            self.slot_meta[slot, :4] = (WRITING, height, width, channels)
+        return seq, self._view(slot)
+
+    def commit(self, seq: int, timestamp: Optional[float] = None):
+        """Publish the slot filled after ``acquire``"""
+        slot = int(self.header[2])
+        self.timestamps[slot] = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.slot_meta[slot, 0] = seq
+            self.header[0] = seq
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """Copy a frame into the ring (use acquire/commit to decode in place instead)"""
+        seq, view = self.acquire(frame.shape)
+        view[...] = frame
+        self.commit(seq, timestamp)
+        return seq
+
+    # --- Reader side ---
+
+    def latest_seq(self) -> int:
+        return int(self.header[0])
+
+    def claim_next(self) -> Optional[Tuple[int, np.ndarray, float]]:
+        """Pin and return the next unclaimed frame as (seq, view, timestamp)
+
+        Each frame goes to one worker. A worker that has fallen behind skips
+        ahead to the oldest frame still in the ring. Call ``release(seq)``
+        when done with the view.
+        """
+        with self.lock:
+            claimed = int(self.header[1])
+            available = self.slot_meta[:, 0]
+            candidates = available[available > claimed]
+            if len(candidates) == 0:
+                return None
+            seq = int(candidates.min())
+            slot = int(np.flatnonzero(available == seq)[0])
+            self.slot_meta[slot, 4] += 1
+            self.header[1] = seq
+        return seq, self._view(slot), float(self.timestamps[slot])
+
+    def release(self, seq: int):
+        """Unpin a claimed frame so its slot can be reused"""
+        with self.lock:
+            slots = np.flatnonzero(self.slot_meta[:, 0] == seq)
+            if len(slots):
+                self.slot_meta[slots[0], 4] -= 1
+
+    def close(self):
+        # Drop numpy views before closing the mapping
+        del self.header, self.slot_meta, self.timestamps, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def decoder_process(ring_name: str, lock, video_source: str, stop: Event):
+    """Decode frames from ``cv2.VideoCapture`` straight into ring slots"""
+    ring = FrameRing.attach(ring_name, lock)
+    cap = cv2.VideoCapture(int(video_source) if video_source.isdigit() else video_source)
+    # Pace at the source frame rate so recorded files behave like live feeds
+    frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25.0)
+    next_due = time.perf_counter()
+    shape = None
+    try:
+        while not stop.is_set():
+            next_due += frame_interval
+            time.sleep(max(0.0, next_due - time.perf_counter()))
+
+            if shape is None:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                shape = frame.shape
+                ring.write(frame)
+                continue
+
+            # Decode straight into the next slot
+            seq, view = ring.acquire(shape)
+            ret, frame = cap.read(view)
+            if not ret:
+                break
+            if not np.shares_memory(frame, view):
+                # Resolution changed mid-stream; this frame has to be copied
+                shape = frame.shape
+                seq, view = ring.acquire(shape)
+                view[...] = frame
+            ring.commit(seq)
+    finally:
+        cap.release()
+        ring.close()
+        stop.set()
+
+
+def counter_worker(ring_name: str, lock, location: str, results: Queue, stop: Event):
+    """Run PersonCounter detection on frames claimed from a ring
+
+    Forecasting and alert hysteresis state are kept in the parent,
+    so workers only detect and count.
+    """
+    from crowd_analysis import PersonCounter
+
+    ring = FrameRing.attach(ring_name, lock)
+    counter = PersonCounter()
+    try:
+        while True:
+            done = stop.is_set()
+            item = ring.claim_next()
+            if item is None:
+                if done:
+                    break
+                time.sleep(0.002)
+                continue
+            seq, frame, timestamp = item
+            try:
+                result = counter.analyze_image(frame, location, update_state=False)
+            finally:
+                del frame
+                ring.release(seq)
+            result['analysis']['frame_seq'] = seq
+            result['analysis']['frame_timestamp'] = timestamp
+            results.put(result)
+    finally:
+        ring.close()
+
+
+def main():
+    """Main function for command-line usage"""
+    if len(sys.argv) < 2:
+        print(json.dumps({'error': 'Usage: frame_ring.py <video_source> [location] [workers] [analytics_dir]'}))
+        return
+
+    video_source = sys.argv[1]
+    location = sys.argv[2] if len(sys.argv) > 2 else 'ram_ghat'
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    # Workers hand results back here, so this process is the store's only writer
+    store = AnalyticsStore(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    cap = cv2.VideoCapture(int(video_source) if video_source.isdigit() else video_source)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        print(json.dumps({'error': f'Cannot read video source: {video_source}'}))
+        return
+
+    from crowd_analysis import PersonCounter
+    # The only PersonCounter whose alert state is updated, and the forecaster
+    # for this feed; both see every frame in order
+    counter = PersonCounter()
+    forecaster = CrowdForecaster()
+
+    lock = Lock()
+    # Every worker may pin one slot; the rest absorb decoder jitter. A unique name
+    # keeps a segment left behind by a crashed run from blocking the next one.
+    ring = FrameRing(f'drishti_{os.getpid()}_{uuid.uuid4().hex[:8]}', lock,
+                     slots=workers + 6, max_shape=frame.shape, create=True)
+    stop = Event()
+    results = Queue()
+    processes = [Process(target=decoder_process, args=(ring.name, lock, video_source, stop))]
+    processes += [Process(target=counter_worker, args=(ring.name, lock, location, results, stop))
+                  for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    def emit(result: Dict):
+        analysis = result['analysis']
+        if result['success']:
+            counter.update_location_state(analysis, analysis['frame_timestamp'])
+            forecaster.update(location, analysis['total_persons'], analysis['capacity'],
+                              analysis['frame_timestamp'])
+            analysis['forecast'] = forecaster.predict(location)
+            analysis.pop('detection_boxes', None)
+        if store is not None and result['success']:
+            store.append(location, analysis['total_persons'], analysis['frame_timestamp'],
+                         zone_counts=analysis['zone_counts'], density=analysis['density'],
+                         crowd_percentage=analysis['crowd_percentage'],
+                         crowd_level=analysis['crowd_level'], alert_level=analysis['alert_level'])
+        print(json.dumps(result))
+
+    # Workers finish out of order, but forecasting, dwell and the store need frame
+    # order. Results are held briefly and emitted by frame_seq; one that arrives
+    # after a later frame was emitted is dropped, as an overwritten frame would be.
+    pending = []
+    reorder_depth = 2 * workers
+    last_seq = 0
+    try:
+        while any(process.is_alive() for process in processes[1:]) or not results.empty():
+            try:
+                result = results.get(timeout=0.5)
+            except Exception:
+                continue
+            seq = result['analysis']['frame_seq']
+            if seq < last_seq:
+                continue
+            heapq.heappush(pending, (seq, result))
+            while len(pending) > reorder_depth:
+                last_seq, result = heapq.heappop(pending)
+                emit(result)
+        while pending:
+            last_seq, result = heapq.heappop(pending)
+            emit(result)
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        for process in processes:
+            process.join()
+        ring.close()
+        if store is not None:
+            store.close()
+
+
+if __name__ == '__main__':
+    main()
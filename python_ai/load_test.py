@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Load Test - Offline replay of camera traffic against the local AI services
+Drives /analyze/crowd, /analyze/faces and the crowd_analysis.py CLI at stepped request rates to find capacity
+
+Usage: python load_test.py <frames_or_videos_dir> [--rates 1,2,4,8] [--duration 30] [--concurrency 8]
+                           [--targets crowd:0.7,faces:0.2,cli:0.1] [--pid <service_pid>] [--json]
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+DEFAULT_LOCATIONS = 'ram_ghat,mahakal_temple,triveni,parking'
+CLI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crowd_analysis.py')
+
+
+def load_frames(source_dir: str, max_frames: int = 200, video_stride: int = 25,
+                max_width: int = 640) -> List[Tuple[str, bytes]]:
+    """JPEG-encoded frames from the images and videos in a directory, resized to ``max_width``"""
+    frames = []
+
+    def add(name, frame):
+        if frame.shape[1] > max_width:
+            height = int(frame.shape[0] * max_width / frame.shape[1])
+            frame = cv2.resize(frame, (max_width, height), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if ok:
+            frames.append((name, encoded.tobytes()))
+
+    for name in sorted(os.listdir(source_dir)):
+        path = os.path.join(source_dir, name)
+        extension = os.path.splitext(name)[1].lower()
+        if extension in IMAGE_EXTENSIONS:
+            frame = cv2.imread(path)
+            if frame is not None:
+                add(name, frame)
+        elif extension in VIDEO_EXTENSIONS:
+            # Sample every Nth frame so one long video does not dominate the mix
+            cap = cv2.VideoCapture(path)
+            index = 0
+            while len(frames) < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if index % video_stride == 0:
+                    add(f'{name}#{index}', frame)
+                index += 1
+            cap.release()
+        if len(frames) >= max_frames:
+            break
+    return frames
+
+
+def post_image(url: str, filename: str, data: bytes, timeout: float) -> Dict:
+    """POST one image as multipart/form-data field ``file`` using only the standard library"""
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'.encode(),
+        b'Content-Type: image/jpeg\r\n\r\n',
+        data,
+        f'\r\n--{boundary}--\r\n'.encode()
+    ])
+    request = urllib.request.Request(url, data=body, method='POST',
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class ServiceTargets:
+    """Sends one frame to a named target and reports (ok, error)"""
+
+    def __init__(self, base_url: str, timeout: float, deadline_ms: Optional[float] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.deadline_ms = deadline_ms
+
+    def send(self, target: str, location: str, name: str,
+             data: bytes) -> Tuple[bool, Optional[str], Optional[float]]:
+        """Returns (ok, error, peak RSS in MB of the CLI child or None for HTTP targets)"""
+        rss_mb = None
+        try:
+            if target == 'crowd':
+                result = post_image(f'{self.base_url}/analyze/crowd?location={location}', name, data, self.timeout)
+            elif target == 'faces':
+                result = post_image(f'{self.base_url}/analyze/faces', name, data, self.timeout)
+            elif target == 'cli':
+                result, rss_mb = self._run_cli(location, data)
+            else:
+                return False, f'unknown target {target}', None
+        except urllib.error.HTTPError as e:
+            return False, f'HTTP {e.code}', None
+        except (urllib.error.URLError, OSError, subprocess.SubprocessError, ValueError) as e:
+            return False, type(e).__name__, None
+        if not result.get('success', False):
+            return False, 'unsuccessful response', rss_mb
+        return True, None, rss_mb
+
+    def _run_cli(self, location: str, data: bytes) -> Tuple[Dict, float]:
+        # Same invocation as the Node server: one process per frame, image as base64 argv
+        command = [sys.executable, CLI_SCRIPT, 'analyze_frame', base64.b64encode(data).decode(), location]
+        if self.deadline_ms is not None:
+            command.append(str(self.deadline_ms))
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        timer = threading.Timer(self.timeout, process.kill)
+        timer.start()
+        try:
+            stdout = process.stdout.read()
+            # Reap the child ourselves so its own rusage (not the harness lifetime's) gives its peak RSS
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+            process.stdout.close()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            if process.returncode == -9:
+                raise subprocess.TimeoutExpired(command, self.timeout)
+            raise subprocess.SubprocessError(f'exit code {process.returncode}')
+        return json.loads(stdout.decode().strip().splitlines()[-1]), usage.ru_maxrss / 1024
+
+
+class ResourceSampler:
+    """Samples CPU and RSS of service processes from /proc while a step runs"""
+
+    def __init__(self, pids: List[int], interval: float = 1.0):
+        self.pids = pids
+        self.interval = interval
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.samples: List[Dict] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _read(self, pid: int) -> Optional[Tuple[float, float]]:
+        """(cpu seconds, rss MB) for one process, or None if it is gone"""
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                # Fields after the parenthesised command name; utime and stime are 14 and 15
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{pid}/status') as f:
+                rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            return None
+        return (int(fields[11]) + int(fields[12])) / self.ticks, rss_kb / 1024
+
+    def _run(self, context: Dict):
+        previous = {pid: self._read(pid) for pid in self.pids}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            for pid in self.pids:
+                current = self._read(pid)
+                if current is None or previous.get(pid) is None:
+                    previous[pid] = current
+                    continue
+                self.samples.append({
+                    'time': round(time.time(), 3),
+                    'pid': pid,
+                    'cpu_percent': round((current[0] - previous[pid][0]) / (now - last) * 100, 1),
+                    'rss_mb': round(current[1], 1),
+                    **context
+                })
+                previous[pid] = current
+            last = now
+
+    def start(self, context: Dict):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(context,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> List[Dict]:
+        """Stop sampling and return the samples taken since ``start``"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        samples, self.samples = self.samples, []
+        return samples
+
+
+def run_step(targets: ServiceTargets, frames: List[Tuple[str, bytes]], mix: List[Tuple[str, float]],
+             locations: List[str], rate: float, duration: float, concurrency: int,
+             sampler: ResourceSampler, rng: random.Random) -> Tuple[Dict, List[Dict]]:
+    """Open-loop load at ``rate`` requests/second for ``duration`` seconds
+
+    Requests are scheduled on a fixed clock whether or not earlier ones have
+    finished, and latency counts from the scheduled time, so queueing inside
+    an overloaded service shows up instead of being hidden by a slower client.
+    """
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    records = []
+    records_lock = threading.Lock()
+
+    def fire(scheduled, target, location, frame):
+        started = time.perf_counter()
+        ok, error, rss_mb = targets.send(target, location, *frame)
+        finished = time.perf_counter()
+        with records_lock:
+            records.append({'target': target, 'ok': ok, 'error': error, 'rss_mb': rss_mb,
+                            'latency_ms': (finished - scheduled) * 1000,
+                            'service_ms': (finished - started) * 1000})
+
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    sampler.start({'rate': rate})
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    futures = []
+    step_started = time.perf_counter()
+    total = max(1, int(rate * duration))
+    for index in range(total):
+        scheduled = step_started + index / rate
+        time.sleep(max(0.0, scheduled - time.perf_counter()))
+        futures.append(executor.submit(fire, scheduled, rng.choices(names, weights)[0],
+                                       rng.choice(locations), rng.choice(frames)))
+    wait(futures)
+    executor.shutdown()
+    elapsed = time.perf_counter() - step_started
+    samples = sampler.stop()
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    latencies = np.array([record['latency_ms'] for record in records if record['ok']])
+    service = np.array([record['service_ms'] for record in records if record['ok']])
+    failures = [record for record in records if not record['ok']]
+    cli_rss = [record['rss_mb'] for record in records if record['rss_mb'] is not None]
+    errors_by_type: Dict[str, int] = {}
+    for record in failures:
+        key = f"{record['target']}: {record['error']}"
+        errors_by_type[key] = errors_by_type.get(key, 0) + 1
+
+    def percentile(values, q):
+        return round(float(np.percentile(values, q)), 1) if len(values) else None
+
+    step = {
+        'target_rate': rate,
+        'requests': len(records),
+        'throughput_rps': round((len(records) - len(failures)) / elapsed, 2),
+        'error_rate': round(len(failures) / max(len(records), 1), 4),
+        'errors': errors_by_type,
+        'latency_ms_p50': percentile(latencies, 50),
+        'latency_ms_p90': percentile(latencies, 90),
+        'latency_ms_p99': percentile(latencies, 99),
+        'latency_ms_max': round(float(latencies.max()), 1) if len(latencies) else None,
+        'service_ms_p50': percentile(service, 50),
+        # CLI runs are child processes of this harness, so they are measured here
+        'cli_cpu_cores': round((children_after.ru_utime + children_after.ru_stime
+                                - children_before.ru_utime - children_before.ru_stime) / elapsed, 2),
+        'cli_peak_rss_mb': round(max(cli_rss), 1) if cli_rss else None,
+        'service_cpu_percent_mean': round(float(np.mean([s['cpu_percent'] for s in samples])), 1)
+        if samples else None,
+        'service_rss_mb_max': round(max(s['rss_mb'] for s in samples), 1) if samples else None,
+        'by_target': {
+            name: {
+                'requests': sum(1 for record in records if record['target'] == name),
+                'latency_ms_p90': percentile([record['latency_ms'] for record in records
+                                              if record['target'] == name and record['ok']], 90)
+            }
+            for name in names
+        }
+    }
+    return step, samples
+
+
+def capacity(steps: List[Dict], slo_ms: float, max_error_rate: float) -> Optional[float]:
+    """Highest offered rate that kept p90 latency and error rate within limits"""
+    passing = [step['target_rate'] for step in steps
+               if step['latency_ms_p90'] is not None and step['latency_ms_p90'] <= slo_ms
+               and step['error_rate'] <= max_error_rate
+               and step['throughput_rps'] >= 0.9 * step['target_rate']]
+    return max(passing) if passing else None
+
+
+def format_report(steps: List[Dict]) -> str:
+    columns = [
+        ('target_rate', 'Rate', 8),
+        ('throughput_rps', 'Done/s', 9),
+        ('latency_ms_p50', 'p50 ms', 9),
+        ('latency_ms_p90', 'p90 ms', 9),
+        ('latency_ms_p99', 'p99 ms', 9),
+        ('error_rate', 'Errors', 9),
+        ('service_cpu_percent_mean', 'CPU %', 8),
+        ('service_rss_mb_max', 'RSS MB', 8),
+        ('cli_cpu_cores', 'CLI cores', 10)
+    ]
+    lines = [''.join(title.ljust(width) for _, title, width in columns)]
+    for step in steps:
+        lines.append(''.join(str(step[key]).ljust(width) for key, _, width in columns))
+    return '\n'.join(lines)
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in value.split(','):
+        name, _, weight = part.strip().partition(':')
+        mix.append((name, float(weight) if weight else 1.0))
+    return mix
+
+
+def main():
+    """Main function for command-line usage"""
+    parser = argparse.ArgumentParser(description='Replay camera frames against the local AI services')
+    parser.add_argument('source_dir', help='Directory of images and/or videos to replay')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of ai_service')
+    parser.add_argument('--targets', default='crowd:0.7,faces:0.2,cli:0.1',
+                        help='Weighted mix of crowd, faces and cli requests')
+    parser.add_argument('--locations', default=DEFAULT_LOCATIONS, help='Comma-separated locations to mix')
+    parser.add_argument('--rates', default='1,2,4,8', help='Comma-separated request rates (req/s) to step through')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per rate step')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum requests in flight')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--deadline-ms', type=float, default=None, help='deadline_ms passed to the CLI')
+    parser.add_argument('--pid', type=int, action='append', default=[], help='Service PID to sample (repeatable)')
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='Seconds between CPU/RSS samples')
+    parser.add_argument('--max-frames', type=int, default=200, help='Frames to load from the source directory')
+    parser.add_argument('--max-width', type=int, default=640, help='Resize frames wider than this')
+    parser.add_argument('--slo-ms', type=float, default=1000.0, help='p90 latency limit for the capacity estimate')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Error rate limit for capacity')
+    parser.add_argument('--timeline', help='Write CPU/RSS samples as JSON lines to this file')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the request mix')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    frames = load_frames(args.source_dir, args.max_frames, max_width=args.max_width)
+    if not frames:
+        print(json.dumps({'error': f'No images or videos found in {args.source_dir}'}))
+        sys.exit(1)
+
+    targets = ServiceTargets(args.url, args.timeout, args.deadline_ms)
+    sampler = ResourceSampler(args.pid, args.sample_interval)
+    mix = parse_mix(args.targets)
+    locations = [location.strip() for location in args.locations.split(',') if location.strip()]
+    rng = random.Random(args.seed)
+
+    steps = []
+    timeline = open(args.timeline, 'w') if args.timeline else None
+    try:
+        for rate in (float(value) for value in args.rates.split(',')):
+            step, samples = run_step(targets, frames, mix, locations, rate, args.duration,
+                                     args.concurrency, sampler, rng)
+            steps.append(step)
+            if timeline is not None:
+                for sample in samples:
+                    timeline.write(json.dumps(sample) + '\n')
+            if not args.json:
+                print(f"rate {rate:g} req/s: {step['throughput_rps']} done/s, "
+                      f"p90 {step['latency_ms_p90']} ms, errors {step['error_rate']:.1%}", file=sys.stderr)
+    finally:
+        if timeline is not None:
+            timeline.close()
+
+    report = {
+        'frames': len(frames),
+        'mix': dict(mix),
+        'concurrency': args.concurrency,
+        'slo_ms': args.slo_ms,
+        'capacity_rps': capacity(steps, args.slo_ms, args.max_error_rate),
+        'steps': steps
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(steps))
+        print(f"\nCapacity at p90 <= {args.slo_ms:g} ms: {report['capacity_rps']} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Crowd Motion Analysis - Per-camera dense optical flow on a fixed low-resolution grid
+Flags surges, counter-flow and bottlenecks incrementally from consecutive frames
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class CameraMotionState:
+    """Previous frame and per-cell running baselines for one camera"""
+
+    __slots__ = ('prev_gray', 'last_timestamp', 'baseline', 'surge_streak', 'frames')
+
+    def __init__(self, grid: Tuple[int, int]):
+        self.prev_gray = None
+        self.last_timestamp = None
+        self.baseline = np.zeros(grid, dtype=np.float32)
+        self.surge_streak = np.zeros(grid, dtype=np.int32)
+        self.frames = 0
+
+
+class MotionAnalyzer:
+    """Stateful crowd motion analyzer with bounded per-frame cost"""
+
+    def __init__(self,
+                 analysis_size: Tuple[int, int] = (160, 120),
+                 grid: Tuple[int, int] = (4, 4),
+                 min_speed: float = 0.3,
+                 surge_ratio: float = 2.5,
+                 surge_frames: int = 3,
+                 baseline_smoothing: float = 0.05,
+                 max_gap_seconds: float = 5.0):
+        # All flow is computed at analysis_size (width, height), whatever the camera resolution
+        self.analysis_size = analysis_size
+        self.grid = grid
+        # Pixels per frame at analysis resolution below which a pixel counts as still
+        self.min_speed = min_speed
+        self.surge_ratio = surge_ratio
+        self.surge_frames = surge_frames
+        self.baseline_smoothing = baseline_smoothing
+        # Frames further apart than this are not compared; the camera restarts warm-up
+        self.max_gap_seconds = max_gap_seconds
+        self.states: Dict[str, CameraMotionState] = {}
+
+        rows, cols = grid
+        width, height = analysis_size
+        self.cell_height = height // rows
+        self.cell_width = width // cols
+
+    def _cells(self, values: np.ndarray) -> np.ndarray:
+        """Reshape an (H, W, ...) field into (rows, cols, cell_h * cell_w, ...) blocks"""
+        rows, cols = self.grid
+        values = values[:rows * self.cell_height, :cols * self.cell_width]
+        blocks = values.reshape(rows, self.cell_height, cols, self.cell_width, *values.shape[2:])
+        blocks = blocks.swapaxes(1, 2)
+        return blocks.reshape(rows, cols, self.cell_height * self.cell_width, *values.shape[2:])
+
+    def update(self, camera_id: str, frame: np.ndarray, timestamp: Optional[float] = None) -> Dict:
+        """Fold one frame into the camera's motion state and report current motion"""
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self.states.get(camera_id)
+        if state is None:
+            state = CameraMotionState(self.grid)
+            self.states[camera_id] = state
+
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, self.analysis_size, interpolation=cv2.INTER_AREA)
+
+        stale = state.last_timestamp is None or timestamp - state.last_timestamp > self.max_gap_seconds
+        previous = state.prev_gray
+        state.prev_gray = gray
+        state.last_timestamp = timestamp
+        if stale or previous is None:
+            state.surge_streak[:] = 0
+            return {'ready': False}
+
+        flow = cv2.calcOpticalFlowFarneback(previous, gray, None, 0.5, 2, 9, 2, 5, 1.1, 0)
+        return self._summarise(state, flow)
+
+    def _summarise(self, state: CameraMotionState, flow: np.ndarray) -> Dict:
+        magnitude = np.linalg.norm(flow, axis=2)
+        moving = magnitude > self.min_speed
+
+        cell_flow = self._cells(flow)
+        cell_magnitude = self._cells(magnitude)
+        cell_moving = self._cells(moving)
+
+        speed = cell_magnitude.mean(axis=2)
+        mean_vector = cell_flow.mean(axis=2)
+        mean_vector_length = np.linalg.norm(mean_vector, axis=2)
+        # 1.0 when every pixel moves the same way, near 0 for chaotic motion
+        coherence = mean_vector_length / np.maximum(speed, 1e-6)
+
+        # Share of moving pixels heading against their cell's dominant direction
+        direction = mean_vector / np.maximum(mean_vector_length, 1e-6)[..., None]
+        against = np.einsum('rcpk,rck->rcp', cell_flow, direction) < 0
+        moving_count = cell_moving.sum(axis=2)
+        counter_flow = (against & cell_moving).sum(axis=2) / np.maximum(moving_count, 1)
+
+        # Surges: sustained speed well above the cell's running baseline
+        if state.frames == 0:
+            state.baseline[:] = speed
+        surging = (speed > self.surge_ratio * np.maximum(state.baseline, self.min_speed)) & (speed > self.min_speed)
+        state.surge_streak = np.where(surging, state.surge_streak + 1, 0)
+        state.baseline += self.baseline_smoothing * (np.where(surging, state.baseline, speed) - state.baseline)
+        state.frames += 1
+        surge_cells = state.surge_streak >= self.surge_frames
+
+        # Bottlenecks: neighbours flow in (negative divergence) while the cell itself is slow
+        divergence = np.gradient(mean_vector[..., 0], axis=1) + np.gradient(mean_vector[..., 1], axis=0)
+        neighbour_speed = cv2.blur(speed, (3, 3), borderType=cv2.BORDER_REPLICATE)
+        bottleneck_cells = (divergence < -self.min_speed) & (speed < 0.5 * neighbour_speed)
+
+        counter_flow_cells = (counter_flow > 0.35) & (moving_count > 0.2 * cell_moving.shape[2])
+        # Adjacent coherent streams heading in opposite directions also count
+        streaming = (speed > self.min_speed) & (coherence > 0.5)
+        for axis in (0, 1):
+            first = [slice(None), slice(None)]
+            second = [slice(None), slice(None)]
+            first[axis], second[axis] = slice(None, -1), slice(1, None)
+            first, second = tuple(first), tuple(second)
+            opposed = np.sum(direction[first] * direction[second], axis=-1) < -0.5
+            opposed &= streaming[first] & streaming[second]
+            counter_flow_cells[first] |= opposed
+            counter_flow_cells[second] |= opposed
+        moving_share = float(moving.mean())
+        overall_coherence = float(np.linalg.norm(flow.reshape(-1, 2).mean(axis=0)) / max(magnitude.mean(), 1e-6))
+
+        if surge_cells.any():
+            pattern = 'surge'
+        elif counter_flow_cells.any():
+            pattern = 'counter_flow'
+        elif moving_share < 0.05:
+            pattern = 'static'
+        elif overall_coherence > 0.6:
+            pattern = 'flowing'
+        else:
+            pattern = 'turbulent'
+
+        def cell_names(mask):
+            return [f'Cell {r + 1}-{c + 1}' for r, c in zip(*np.nonzero(mask))]
+
+        return {
+            'ready': True,
+            'movement_pattern': pattern,
+            'mean_speed': round(float(magnitude.mean()), 3),
+            'moving_share': round(moving_share, 3),
+            'coherence': round(overall_coherence, 3),
+            'surge_cells': cell_names(surge_cells),
+            'counter_flow_cells': cell_names(counter_flow_cells),
+            'bottleneck_cells': cell_names(bottleneck_cells),
+            'panic_indicators': bool(surge_cells.any() and (counter_flow_cells.any() or overall_coherence < 0.3)),
+            'cell_speed': np.round(speed, 3).tolist(),
+            'cell_coherence': np.round(coherence, 3).tolist(),
+            'cell_counter_flow': np.round(counter_flow, 3).tolist()
+        }
+
+    def reset(self, camera_id: str):
+        self.states.pop(camera_id, None)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Occupancy Heatmap - Per-location spatial occupancy from detected person boxes
+Exponentially decaying live grid plus hourly snapshots, updated at constant cost per detection
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class LocationHeatmap:
+    """Decaying and hourly occupancy grids for one location
+
+    The live grid is stored scaled by exp((t - reference) / tau), so a frame
+    only touches the cells of its detections and decay is applied when read.
+    """
+
+    __slots__ = ('grid', 'frame_weight', 'reference', 'hour_start', 'hour_sum', 'hour_frames', 'snapshots')
+
+    def __init__(self, grid: Tuple[int, int], reference: float):
+        self.grid = np.zeros(grid, dtype=np.float64)
+        self.frame_weight = 0.0
+        self.reference = reference
+        self.hour_start = None
+        self.hour_sum = np.zeros(grid, dtype=np.float64)
+        self.hour_frames = 0
+        self.snapshots: 'OrderedDict[float, np.ndarray]' = OrderedDict()
+
+
+class OccupancyHeatmap:
+    """Accumulates box centres per location into coarse occupancy grids"""
+
+    def __init__(self, grid: Tuple[int, int] = (48, 64), half_life_seconds: float = 600.0,
+                 snapshot_seconds: int = 3600, max_snapshots: int = 168):
+        # grid is (rows, cols); cells are fractions of the frame so any resolution maps onto it
+        self.grid = grid
+        self.tau = half_life_seconds / math.log(2)
+        self.snapshot_seconds = snapshot_seconds
+        self.max_snapshots = max_snapshots
+        self.states: Dict[str, LocationHeatmap] = {}
+
+    def _state(self, location: str, timestamp: float) -> LocationHeatmap:
+        state = self.states.get(location)
+        if state is None:
+            state = LocationHeatmap(self.grid, timestamp)
+            self.states[location] = state
+        return state
+
+    def _roll_hour(self, state: LocationHeatmap, timestamp: float):
+        hour_start = timestamp // self.snapshot_seconds * self.snapshot_seconds
+        if state.hour_start == hour_start:
+            return
+        if state.hour_start is not None and state.hour_frames:
+            # Mean persons per cell per frame over the finished period
+            state.snapshots[state.hour_start] = (state.hour_sum / state.hour_frames).astype(np.float32)
+            while len(state.snapshots) > self.max_snapshots:
+                state.snapshots.popitem(last=False)
+        state.hour_start = hour_start
+        state.hour_sum[:] = 0
+        state.hour_frames = 0
+
+    def add(self, location: str, person_boxes, frame_shape: Tuple, timestamp: Optional[float] = None):
+        """Fold one frame's (x, y, w, h) person boxes into the location's grids"""
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self._state(location, timestamp)
+        self._roll_hour(state, timestamp)
+
+        exponent = (timestamp - state.reference) / self.tau
+        if exponent > 50:
+            # Rebase before the scaled weights overflow
+            scale = math.exp(-exponent)
+            state.grid *= scale
+            state.frame_weight *= scale
+            state.reference = timestamp
+            exponent = 0.0
+        weight = math.exp(exponent)
+        state.frame_weight += weight
+        state.hour_frames += 1
+
+        if len(person_boxes) == 0:
+            return
+        rows, cols = self.grid
+        height, width = frame_shape[:2]
+        boxes = np.asarray(person_boxes, dtype=np.float64).reshape(-1, 4)
+        centre_x = (boxes[:, 0] + boxes[:, 2] / 2) / width
+        centre_y = (boxes[:, 1] + boxes[:, 3] / 2) / height
+        cell_rows = np.clip((centre_y * rows).astype(np.int64), 0, rows - 1)
+        cell_cols = np.clip((centre_x * cols).astype(np.int64), 0, cols - 1)
+        np.add.at(state.grid, (cell_rows, cell_cols), weight)
+        np.add.at(state.hour_sum, (cell_rows, cell_cols), 1.0)
+
+    def array(self, location: str, hour: Optional[float] = None) -> Optional[np.ndarray]:
+        """Mean persons per cell per frame: decayed live view, or the snapshot starting at ``hour``"""
+        state = self.states.get(location)
+        if state is None:
+            return None
+        if hour is not None:
+            hour_start = hour // self.snapshot_seconds * self.snapshot_seconds
+            if hour_start == state.hour_start and state.hour_frames:
+                return (state.hour_sum / state.hour_frames).astype(np.float32)
+            return state.snapshots.get(hour_start)
+        if state.frame_weight == 0:
+            return np.zeros(self.grid, dtype=np.float32)
+        # The common decay factor cancels between cell weights and frame weight
+        return (state.grid / state.frame_weight).astype(np.float32)
+
+    def snapshot_hours(self, location: str) -> List[float]:
+        state = self.states.get(location)
+        return list(state.snapshots) if state is not None else []
+
+    def hotspots(self, location: str, top: int = 5, hour: Optional[float] = None) -> List[Dict]:
+        """Most occupied cells as frame-relative boxes"""
+        values = self.array(location, hour)
+        if values is None:
+            return []
+        rows, cols = self.grid
+        order = np.argsort(values, axis=None)[::-1][:top]
+        spots = []
+        for index in order:
+            if values.flat[index] <= 0:
+                break
+            row, col = divmod(int(index), cols)
+            spots.append({
+                'zone': (round(col / cols, 3), round(row / rows, 3),
+                         round((col + 1) / cols, 3), round((row + 1) / rows, 3)),
+                'occupancy': round(float(values.flat[index]), 4)
+            })
+        return spots
+
+    def render(self, location: str, width: int = 320, hour: Optional[float] = None,
+               background: Optional[np.ndarray] = None) -> Optional[bytes]:
+        """PNG of the heatmap, optionally blended over a camera frame"""
+        values = self.array(location, hour)
+        if values is None:
+            return None
+        rows, cols = self.grid
+        height = int(round(width * rows / cols))
+        peak = float(values.max())
+        scaled = np.zeros(values.shape, dtype=np.uint8) if peak <= 0 else \
+            np.clip(values / peak * 255, 0, 255).astype(np.uint8)
+        image = cv2.applyColorMap(cv2.resize(scaled, (width, height), interpolation=cv2.INTER_LINEAR),
+                                  cv2.COLORMAP_JET)
+        if background is not None:
+            frame = cv2.resize(background, (width, height), interpolation=cv2.INTER_AREA)
+            if frame.ndim == 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+            image = cv2.addWeighted(frame, 0.5, image, 0.5, 0)
+        ok, buffer = cv2.imencode('.png', image)
+        return buffer.tobytes() if ok else None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Perspective Density - Ground-plane calibration of fixed cameras for people-per-square-metre density
+Each camera's homography is turned once into cached ground-area maps; per frame only box foot-points are looked up
+
+Calibration file (camera_calibrations.json), image points as frame ratios and ground points in metres:
+    {"ram_ghat": {"image_points": [[0.1, 0.9], [0.9, 0.9], [0.7, 0.3], [0.3, 0.3]],
+                  "ground_points": [[0, 0], [20, 0], [20, 35], [0, 35]]}}
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+class GroundPlaneCalibration:
+    """Homography from image pixels to ground-plane metres for one camera"""
+
+    def __init__(self, image_points: Sequence[Sequence[float]], ground_points: Sequence[Sequence[float]],
+                 max_area_per_pixel: float = 0.05):
+        if len(image_points) < 4 or len(image_points) != len(ground_points):
+            raise ValueError("Calibration needs at least four matching image and ground points")
+        homography, _ = cv2.findHomography(np.asarray(image_points, dtype=np.float64),
+                                           np.asarray(ground_points, dtype=np.float64))
+        if homography is None:
+            raise ValueError("Calibration points are degenerate")
+        # Maps frame-ratio coordinates to metres, so any resolution can reuse it
+        self.normalized_homography = homography
+        # Pixels near the horizon cover huge ground areas; treat them as off the walkable ground
+        self.max_area_per_pixel = max_area_per_pixel
+        self._area_maps: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def homography(self, frame_shape: Tuple) -> np.ndarray:
+        height, width = frame_shape[:2]
+        return self.normalized_homography @ np.diag([1.0 / width, 1.0 / height, 1.0])
+
+    def area_map(self, frame_shape: Tuple) -> np.ndarray:
+        """Ground area in square metres covered by each pixel (0 where not on the ground)
+
+        For a homography H the Jacobian determinant at (u, v) is
+        det(H) / w**3 with w = h31*u + h32*v + h33, so the map is closed form.
+        """
+        key = tuple(frame_shape[:2])
+        area = self._area_maps.get(key)
+        if area is None:
+            height, width = key
+            homography = self.homography(frame_shape)
+            u = np.arange(width, dtype=np.float64) + 0.5
+            v = np.arange(height, dtype=np.float64)[:, None] + 0.5
+            w = homography[2, 0] * u + homography[2, 1] * v + homography[2, 2]
+            # Behind the camera's horizon the sign of w flips relative to the calibrated points
+            reference = homography[2] @ np.array([width / 2, height - 0.5, 1.0])
+            area = np.abs(np.linalg.det(homography) / w ** 3)
+            area[(w * reference <= 0) | (area > self.max_area_per_pixel)] = 0.0
+            area = area.astype(np.float32)
+            self._area_maps[key] = area
+        return area
+
+    def to_ground(self, points: np.ndarray, frame_shape: Tuple) -> np.ndarray:
+        """Project (N, 2) pixel points to ground metres"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(points, self.homography(frame_shape)).reshape(-1, 2)
+
+
+class PerspectiveDensityEstimator:
+    """Per-location calibrations with cached zone maps for foot-point density lookups"""
+
+    def __init__(self):
+        self.calibrations: Dict[str, GroundPlaneCalibration] = {}
+        # (location, frame shape, zones) -> (zone id per pixel, ground area per zone in m2)
+        self._zone_maps: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def calibrate(self, location: str, image_points, ground_points, **options):
+        self.calibrations[location] = GroundPlaneCalibration(image_points, ground_points, **options)
+        self._zone_maps = {key: value for key, value in self._zone_maps.items() if key[0] != location}
+
+    def load(self, path: str) -> List[str]:
+        """Load calibrations from a JSON file if it exists; returns the calibrated locations"""
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            calibrations = json.load(f)
+        for location, calibration in calibrations.items():
+            self.calibrate(location, calibration['image_points'], calibration['ground_points'],
+                           **calibration.get('options', {}))
+        return list(calibrations)
+
+    def is_calibrated(self, location: str) -> bool:
+        return location in self.calibrations
+
+    def zone_map(self, location: str, frame_shape: Tuple, zones: Sequence[Tuple[float, float, float, float]]):
+        """Zone index per pixel (-1 outside every zone) and each zone's ground area"""
+        key = (location, tuple(frame_shape[:2]), tuple(tuple(zone) for zone in zones))
+        cached = self._zone_maps.get(key)
+        if cached is None:
+            height, width = frame_shape[:2]
+            area = self.calibrations[location].area_map(frame_shape)
+            zone_ids = np.full((height, width), -1, dtype=np.int8)
+            # Later zones win where zones overlap, so each pixel's area is counted once
+            for index, (x1, y1, x2, y2) in enumerate(zones):
+                zone_ids[int(y1 * height):int(y2 * height), int(x1 * width):int(x2 * width)] = index
+            zone_ids[area == 0] = -1
+            valid = zone_ids >= 0
+            zone_areas = np.bincount(zone_ids[valid], weights=area[valid], minlength=len(zones))
+            cached = (zone_ids, zone_areas)
+            self._zone_maps[key] = cached
+        return cached
+
+    def density(self, location: str, person_boxes, frame_shape: Tuple,
+                zones: Sequence[Tuple[float, float, float, float]]) -> Optional[Dict]:
+        """People per square metre over the location's zones from [x1, y1, x2, y2] boxes"""
+        if location not in self.calibrations:
+            return None
+        zone_ids, zone_areas = self.zone_map(location, frame_shape, zones)
+        height, width = frame_shape[:2]
+
+        zone_counts = np.zeros(len(zones), dtype=np.int64)
+        if len(person_boxes):
+            boxes = np.asarray(person_boxes, dtype=np.int64).reshape(-1, 4)
+            # People stand where the bottom centre of their box meets the ground
+            foot_x = np.clip((boxes[:, 0] + boxes[:, 2]) // 2, 0, width - 1)
+            foot_y = np.clip(boxes[:, 3], 0, height - 1)
+            hits = zone_ids[foot_y, foot_x]
+            zone_counts = np.bincount(hits[hits >= 0], minlength=len(zones))
+
+        total_area = float(zone_areas.sum())
+        return {
+            'zone_counts': zone_counts.tolist(),
+            'zone_areas_m2': np.round(zone_areas, 1).tolist(),
+            'zone_density': [round(float(count / area), 3) if area > 0 else 0.0
+                             for count, area in zip(zone_counts, zone_areas)],
+            'ground_area_m2': round(total_area, 1),
+            'density': round(float(zone_counts.sum() / total_area), 3) if total_area > 0 else 0.0
+        }
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Detector Profiling - Side-by-side cost/accuracy report for registered person detectors
+Runs every detector over a labelled local image set to pick the cheapest one per site
+
+Usage: python profile_detectors.py <image_dir> [--detectors hog,haar_face] [--repeat 3] [--json]
+
+The image directory must contain labels.json mapping image filenames to the
+true person count, e.g. {"ram_ghat_0800.jpg": 42, "triveni_1200.jpg": 130}.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from detectors import available_detectors, create_detector
+
+
+def load_labelled_images(image_dir: str) -> List[Dict]:
+    """Load (name, frame, true count) for every labelled image in the directory"""
+    with open(os.path.join(image_dir, 'labels.json'), 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    samples = []
+    for name, count in sorted(labels.items()):
+        frame = cv2.imread(os.path.join(image_dir, name))
+        if frame is None:
+            print(f"Skipping unreadable image: {name}", file=sys.stderr)
+            continue
+        samples.append({'name': name, 'frame': frame, 'count': int(count)})
+    return samples
+
+
+def profile_detector(name: str, samples: List[Dict], repeat: int = 1) -> Dict:
+    """Time one detector over all samples and compare its counts with the labels"""
+    detector = create_detector(name)
+
+    # Warm-up run so lazy initialisation does not skew the first latency
+    detector.detect(samples[0]['frame'])
+
+    latencies_ms = []
+    errors = []
+    megapixels = 0.0
+    for sample in samples:
+        frame = sample['frame']
+        for _ in range(repeat):
+            started = time.perf_counter()
+            boxes = detector.detect(frame)
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+            megapixels += (frame.shape[0] * frame.shape[1]) / 1e6
+        errors.append(len(boxes) - sample['count'])
+
+    latencies = np.array(latencies_ms)
+    errors = np.array(errors, dtype=float)
+    counts = np.array([sample['count'] for sample in samples], dtype=float)
+    total_seconds = latencies.sum() / 1000
+
+    return {
+        'detector': name,
+        'images': len(samples),
+        'throughput_fps': round(len(latencies) / total_seconds, 2) if total_seconds > 0 else 0.0,
+        'megapixels_per_second': round(megapixels / total_seconds, 2) if total_seconds > 0 else 0.0,
+        'latency_ms_mean': round(float(latencies.mean()), 1),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 1),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 1),
+        'count_mae': round(float(np.abs(errors).mean()), 2),
+        'count_bias': round(float(errors.mean()), 2),
+        'count_mape': round(float((np.abs(errors) / np.maximum(counts, 1)).mean() * 100), 1)
+    }
+
+
+def format_report(results: List[Dict]) -> str:
+    columns = [
+        ('detector', 'Detector', 16),
+        ('throughput_fps', 'FPS', 8),
+        ('latency_ms_p50', 'p50 ms', 9),
+        ('latency_ms_p95', 'p95 ms', 9),
+        ('count_mae', 'MAE', 8),
+        ('count_bias', 'Bias', 8),
+        ('count_mape', 'MAPE %', 8)
+    ]
+    lines = [''.join(title.ljust(width) for _, title, width in columns)]
+    for result in results:
+        lines.append(''.join(str(result[key]).ljust(width) for key, _, width in columns))
+    return '\n'.join(lines)
+
+
+def main():
+    """Main function for command-line usage"""
+    parser = argparse.ArgumentParser(description='Profile registered person detectors on labelled images')
+    parser.add_argument('image_dir', help='Directory with images and labels.json')
+    parser.add_argument('--detectors', default=','.join(available_detectors()),
+                        help='Comma-separated detector names (default: all registered)')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per image')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    samples = load_labelled_images(args.image_dir)
+    if not samples:
+        print(json.dumps({'error': 'No labelled images found'}))
+        sys.exit(1)
+
+    results = [profile_detector(name.strip(), samples, args.repeat)
+               for name in args.detectors.split(',') if name.strip()]
+    # Cheapest first, so the first row meeting the accuracy target is the pick
+    results.sort(key=lambda result: result['latency_ms_mean'])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_report(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""Tests for the lost-person watchlist"""
+
+import numpy as np
+import pytest
+
+from watchlist import FEATURE_LENGTH, FaceWatchlist
+
+
+def test_add_rejects_wrong_feature_length():
+    watchlist = FaceWatchlist()
+    with pytest.raises(ValueError):
+        watchlist.add('short', [1, 2, 3])
+    assert len(watchlist) == 0
+
+
+def test_match_after_rejected_entry_still_works():
+    watchlist = FaceWatchlist()
+    features = np.arange(1, FEATURE_LENGTH + 1, dtype=np.float32)
+    watchlist.add('lost-1', features)
+    with pytest.raises(ValueError):
+        watchlist.add('bad', features[:10])
+
+    matches = watchlist.match(features[None, :], threshold=0.99)
+    assert [match['person_id'] for match in matches] == ['lost-1']
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Lost Person Watchlist - Live face matching of camera frames against active lost-person reports
+Faces are searched only inside detected person regions and matched in one batched similarity step
+"""
+
+import itertools
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from detectors import load_cascade, to_gray
+
+
+FEATURE_LENGTH = 256
+
+
+def histogram_features(face_roi: np.ndarray) -> np.ndarray:
+    """Grayscale intensity histogram used as the face feature vector"""
+    return cv2.calcHist([face_roi], [0], None, [FEATURE_LENGTH], [0, 256]).flatten()
+
+
+class FaceWatchlist:
+    """Active lost-person reports with their face features, kept as one normalised matrix"""
+
+    def __init__(self, feature_length: int = FEATURE_LENGTH):
+        # Every report must match the length of the features extracted from live frames
+        self.feature_length = feature_length
+        self.entries: Dict[str, Dict] = {}
+        self._ids: List[str] = []
+        self._matrix = None
+
+    def add(self, person_id: str, features: List[float], metadata: Optional[Dict] = None):
+        vector = np.asarray(features, dtype=np.float32)
+        if vector.shape != (self.feature_length,):
+            raise ValueError(f"Face features must be a flat vector of {self.feature_length} values, "
+                             f"got shape {vector.shape}")
+        if not np.all(np.isfinite(vector)):
+            raise ValueError("Face features must be finite numbers")
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            raise ValueError("Face features must not be all zero")
+        self.entries[person_id] = {'vector': vector / norm, 'metadata': metadata or {}}
+        self._matrix = None
+
+    def remove(self, person_id: str) -> bool:
+        removed = self.entries.pop(person_id, None) is not None
+        if removed:
+            self._matrix = None
+        return removed
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _rebuild(self):
+        self._ids = list(self.entries)
+        if self._ids:
+            self._matrix = np.stack([self.entries[person_id]['vector'] for person_id in self._ids])
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def match(self, features: np.ndarray, threshold: float) -> List[Dict]:
+        """Best watchlist match per query row, for rows at or above ``threshold``"""
+        if not self.entries or len(features) == 0:
+            return []
+        if self._matrix is None:
+            self._rebuild()
+
+        queries = np.asarray(features, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-9)
+        # Cosine similarity of every face against every report in one product
+        similarity = queries @ self._matrix.T
+        best = similarity.argmax(axis=1)
+        scores = similarity[np.arange(len(queries)), best]
+
+        matches = []
+        for row in np.flatnonzero(scores >= threshold):
+            person_id = self._ids[best[row]]
+            matches.append({
+                'query_index': int(row),
+                'person_id': person_id,
+                'similarity_score': round(float(scores[row]), 3),
+                'metadata': self.entries[person_id]['metadata']
+            })
+        return matches
+
+
+class LiveWatchlistMatcher:
+    """Throttled per-camera face search inside person boxes, publishing watchlist hits"""
+
+    def __init__(self, watchlist: FaceWatchlist, match_threshold: float = 0.9,
+                 min_interval_seconds: float = 1.0, head_fraction: float = 0.4,
+                 max_history: int = 500):
+        self.watchlist = watchlist
+        self.match_threshold = match_threshold
+        # Face search runs at most once per camera per interval
+        self.min_interval_seconds = min_interval_seconds
+        # Only the top part of each person box is searched for a face
+        self.head_fraction = head_fraction
+        self.face_cascade = load_cascade('haarcascade_frontalface_default.xml')
+        self.last_run: Dict[str, float] = {}
+        self.hits = deque(maxlen=max_history)
+        self.listeners: List[Callable[[Dict], None]] = []
+        self._sequence = itertools.count(1)
+
+    def subscribe(self, listener: Callable[[Dict], None]):
+        """Call ``listener(hit)`` for every new watchlist hit"""
+        self.listeners.append(listener)
+
+    def _head_regions(self, gray: np.ndarray, person_boxes):
+        height, width = gray.shape[:2]
+        for (x, y, w, h) in person_boxes:
+            # Pad the head region so the cascade sees some context around the face
+            x1, y1 = max(int(x - w * 0.25), 0), max(int(y - h * 0.1), 0)
+            x2 = min(int(x + w * 1.25), width)
+            y2 = min(int(y + h * self.head_fraction), height)
+            if x2 - x1 >= 20 and y2 - y1 >= 20:
+                yield x1, y1, gray[y1:y2, x1:x2]
+
+    def process(self, camera_id: str, image: np.ndarray, person_boxes,
+                timestamp: Optional[float] = None) -> List[Dict]:
+        """Search the frame's person regions for watchlist faces; returns new hits
+
+        ``person_boxes`` are (x, y, w, h) regions from crowd counting. Frames
+        arriving within ``min_interval_seconds`` of the last search are skipped.
+        """
+        if len(self.watchlist) == 0 or self.face_cascade is None or len(person_boxes) == 0:
+            return []
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp - self.last_run.get(camera_id, float('-inf')) < self.min_interval_seconds:
+            return []
+        self.last_run[camera_id] = timestamp
+
+        gray = to_gray(image)
+        faces, features = [], []
+        for offset_x, offset_y, region in self._head_regions(gray, person_boxes):
+            for (fx, fy, fw, fh) in self.face_cascade.detectMultiScale(region, 1.1, 5, minSize=(16, 16)):
+                faces.append([offset_x + int(fx), offset_y + int(fy), int(fw), int(fh)])
+                features.append(histogram_features(region[fy:fy + fh, fx:fx + fw]))
+        if not features:
+            return []
+
+        hits = []
+        for match in self.watchlist.match(np.stack(features), self.match_threshold):
+            hit = {
+                'sequence': next(self._sequence),
+                'camera_id': camera_id,
+                'timestamp': timestamp,
+                'person_id': match['person_id'],
+                'similarity_score': match['similarity_score'],
+                'bbox': faces[match['query_index']],
+                'metadata': match['metadata']
+            }
+            self.hits.append(hit)
+            hits.append(hit)
+            for listener in self.listeners:
+                listener(hit)
+        return hits
+
+    def hits_since(self, sequence: int = 0) -> List[Dict]:
+        return [hit for hit in self.hits if hit['sequence'] > sequence]
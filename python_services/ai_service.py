@@ -3,20 +3,32 @@ AI Service for Mahakumbh 2028 Crowd Monitoring System
 Provides computer vision and AI analysis endpoints
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 import cv2
 import numpy as np
 from PIL import Image
-import io
 import base64
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import json
 import os
+import sys
 from scipy.spatial.distance import cosine
 from sklearn.cluster import DBSCAN
 import requests
 
+# Shared person detectors live alongside the crowd counting CLI
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_ai'))
+from alert_engine import AlertEngine, EventBus
+from analytics_store import AnalyticsStore
+from crowd_forecast import CrowdForecaster
+from occupancy_heatmap import OccupancyHeatmap
+from perspective import PerspectiveDensityEstimator
+from detectors import create_detector, load_cascade, load_location_detectors
+from motion_analysis import MotionAnalyzer
+from watchlist import FaceWatchlist, LiveWatchlistMatcher, histogram_features
+
 app = FastAPI(
     title="Drishti AI Service",
     description="AI-powered crowd monitoring and analysis for Mahakumbh 2028",
@@ -32,79 +44,161 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request bodies above this are refused while streaming, before they are spooled
+MAX_REQUEST_BYTES = 25 * 1024 * 1024
+MAX_IMAGE_UPLOAD_BYTES = 20 * 1024 * 1024
+# Decoded size guard against small files that expand to huge images
+MAX_IMAGE_PIXELS = 40_000_000
+
+# (crowd_density, risk_level) by level index, shared by the analysis and the alert engine
+CROWD_LEVELS = (("low", "none"), ("medium", "low"), ("high", "medium"), ("critical", "high"))
+CROWD_LEVEL_INDEX = {crowd_level: index for index, (crowd_level, _) in enumerate(CROWD_LEVELS)}
+
+class RequestSizeLimitMiddleware:
+    """Reject request bodies over ``max_bytes`` by declared length or as they stream in"""
+    
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            response = Response(status_code=413, content=json.dumps({"detail": "Upload too large"}),
+                                media_type="application/json")
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Upload too large")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
+
+def decode_upload_image(file: UploadFile) -> np.ndarray:
+    """Decode an uploaded image as BGR straight from its spooled temporary file
+    
+    The upload is copied once into a preallocated buffer and decoded by
+    OpenCV; the header is checked first so oversized images are never decoded.
+    """
+    spooled = file.file
+    spooled.seek(0, os.SEEK_END)
+    size = spooled.tell()
+    if size > MAX_IMAGE_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image upload too large")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    
+    spooled.seek(0)
+    try:
+        width, height = Image.open(spooled).size
+    except Exception:
+        raise HTTPException(status_code=400, detail="Unsupported image format")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise HTTPException(status_code=413, detail=f"Image too large: {width}x{height}")
+    
+    spooled.seek(0)
+    buffer = np.empty(size, dtype=np.uint8)
+    view = memoryview(buffer)
+    filled = 0
+    while filled < size:
+        read = spooled.readinto(view[filled:])
+        if not read:
+            break
+        filled += read
+    image = cv2.imdecode(buffer[:filled], cv2.IMREAD_COLOR)
+    if image is None:
+        raise HTTPException(status_code=400, detail="Could not decode image")
+    return image
+
 class CrowdAnalyzer:
     """Advanced crowd analysis using computer vision"""
     
-    def __init__(self):
-        # Initialize Haar Cascade for person detection
-        try:
-            self.person_cascade = cv2.CascadeClassifier('haarcascade_fullbody.xml')
-            self.face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
-        except:
-            # Fallback to basic detection if cascades not available
-            self.person_cascade = None
-            self.face_cascade = None
+    def __init__(self, default_detector: str = 'haar_body_face'):
+        # Person detector per location, by registry name; unknown locations use the default
+        self.default_detector = default_detector
+        self.location_detectors: Dict[str, str] = load_location_detectors()
+        self.detectors = {}
+        # Fail fast on a misconfigured default rather than on the first request
+        self.get_detector()
+        # Optical-flow motion state per camera, keyed by location
+        self.motion_analyzer = MotionAnalyzer()
+        # Same ground-plane calibrations as the crowd counting CLI
+        self.perspective = PerspectiveDensityEstimator()
+        self.perspective.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_ai',
+                                           'camera_calibrations.json'))
     
-    def analyze_crowd_density(self, image: np.ndarray) -> Dict[str, Any]:
-        """Analyze crowd density in image"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Detect people and faces using Haar Cascade if available
-        people = []
-        faces = []
-        
-        if self.person_cascade is not None:
-            people = self.person_cascade.detectMultiScale(
-                gray, 
-                scaleFactor=1.1, 
-                minNeighbors=3,
-                minSize=(30, 30)
-            )
-        
-        if self.face_cascade is not None:
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(20, 20)
-            )
+    def get_detector(self, location: Optional[str] = None):
+        """Cached detector instance configured for a location"""
+        name = self.location_detectors.get(location, self.default_detector)
+        if name not in self.detectors:
+            self.detectors[name] = create_detector(name)
+        return self.detectors[name]
+    
+    def detect_people(self, image: np.ndarray, location: Optional[str] = None) -> List:
+        """Person boxes as (x, y, w, h) from the location's detector"""
+        detector = self.get_detector(location)
+        return [(x1, y1, x2 - x1, y2 - y1) for (x1, y1, x2, y2) in detector.detect(image)]
+    
+    def analyze_crowd_density(self, image: np.ndarray, location: Optional[str] = None,
+                              people: Optional[List] = None) -> Dict[str, Any]:
+        """Analyze crowd density in image, reusing ``people`` boxes if already detected"""
+        detector = self.get_detector(location)
+        if people is None:
+            people = self.detect_people(image, location)
         
         height, width = image.shape[:2]
         total_area = height * width
         
         # Calculate crowd metrics
-        person_count = max(len(people), len(faces))
+        person_count = len(people)
         crowd_area = sum([w * h for (x, y, w, h) in people])
         density_ratio = crowd_area / total_area if total_area > 0 else 0
         
+        # People per square metre of visible ground, for calibrated cameras only
+        perspective = self.perspective.density(location, [(x, y, x + w, y + h) for (x, y, w, h) in people],
+                                               image.shape, [(0.0, 0.0, 1.0, 1.0)])
+        
         # Determine density level
         if density_ratio > 0.6 or person_count > 50:
-            density_level = "critical"
-            risk_level = "high"
+            level = 3
         elif density_ratio > 0.4 or person_count > 30:
-            density_level = "high"
-            risk_level = "medium"
+            level = 2
         elif density_ratio > 0.2 or person_count > 15:
-            density_level = "medium"
-            risk_level = "low"
+            level = 1
         else:
-            density_level = "low"
-            risk_level = "none"
+            level = 0
+        density_level, risk_level = CROWD_LEVELS[level]
         
         # Detect potential crowd behavior issues
-        behavior_analysis = self._analyze_crowd_behavior(people, faces, image)
+        behavior_analysis = self._analyze_crowd_behavior(people, image, location)
         
         return {
             "crowd_density": density_level,
             "person_count": person_count,
+            "detector": detector.name,
             "density_ratio": round(density_ratio, 3),
+            "density_per_m2": perspective["density"] if perspective else None,
             "risk_level": risk_level,
             "analysis_confidence": 0.85,
             "behavior_analysis": behavior_analysis,
             "recommendations": self._generate_recommendations(density_level, risk_level, behavior_analysis)
         }
     
-    def _analyze_crowd_behavior(self, people, faces, image: np.ndarray) -> Dict[str, Any]:
+    def _analyze_crowd_behavior(self, people, image: np.ndarray, location: Optional[str] = None) -> Dict[str, Any]:
         """Analyze crowd movement and behavior patterns"""
         behavior = {
             "movement_pattern": "normal",
@@ -113,6 +207,15 @@ class CrowdAnalyzer:
             "panic_indicators": False
         }
         
+        # Motion from consecutive frames of the same camera, when available
+        motion = self.motion_analyzer.update(location or "default", image)
+        if motion["ready"]:
+            behavior["movement_pattern"] = motion["movement_pattern"]
+            behavior["panic_indicators"] = motion["panic_indicators"]
+            behavior["potential_bottlenecks"] = len(motion["bottleneck_cells"]) > 0
+            behavior["congestion_areas"] = motion["bottleneck_cells"]
+            behavior["motion"] = motion
+        
         if len(people) > 0:
             # Analyze clustering
             centers = [(x + w//2, y + h//2) for (x, y, w, h) in people]
@@ -121,8 +224,9 @@ class CrowdAnalyzer:
                 unique_clusters = len(set(clustering.labels_)) - (1 if -1 in clustering.labels_ else 0)
                 
                 if unique_clusters > 3:
-                    behavior["movement_pattern"] = "clustered"
-                    behavior["congestion_areas"] = [f"Zone {i+1}" for i in range(unique_clusters)]
+                    if not motion["ready"]:
+                        behavior["movement_pattern"] = "clustered"
+                    behavior["congestion_areas"] += [f"Zone {i+1}" for i in range(unique_clusters)]
                 
                 # Check for potential bottlenecks
                 if len(people) > 20 and unique_clusters < 2:
@@ -155,16 +259,22 @@ class CrowdAnalyzer:
         if behavior.get("movement_pattern") == "clustered":
             recommendations.append("Guide crowd distribution to reduce clustering")
         
+        if behavior.get("panic_indicators"):
+            recommendations.append("IMMEDIATE: Sudden crowd surge detected, open relief routes")
+        elif behavior.get("movement_pattern") == "surge":
+            recommendations.append("Crowd speed rising sharply, hold inflow at entry points")
+        
+        if behavior.get("movement_pattern") == "counter_flow":
+            recommendations.append("Separate opposing pedestrian flows with barricades or volunteers")
+        
         return recommendations
 
 class FaceRecognitionService:
     """Face recognition for lost person identification"""
     
     def __init__(self):
-        try:
-            self.face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
-        except:
-            self.face_cascade = None
+        # Bundled with OpenCV; None if this build ships without it
+        self.face_cascade = load_cascade('haarcascade_frontalface_default.xml')
     
     def extract_face_features(self, image: np.ndarray) -> List[Dict]:
         """Extract facial features from image"""
@@ -175,7 +285,7 @@ class FaceRecognitionService:
         for (x, y, w, h) in faces:
             face_roi = gray[y:y+h, x:x+w]
             # Simple feature extraction using histogram
-            features = cv2.calcHist([face_roi], [0], None, [256], [0, 256]).flatten()
+            features = histogram_features(face_roi)
             
             face_data.append({
                 "bbox": [int(x), int(y), int(w), int(h)],
@@ -197,33 +307,69 @@ class FaceRecognitionService:
 # Initialize services
 crowd_analyzer = CrowdAnalyzer()
 face_service = FaceRecognitionService()
+watchlist = FaceWatchlist()
+live_matcher = LiveWatchlistMatcher(watchlist)
+
+# Level transitions and watchlist hits are published once on the event bus
+# instead of being re-derived by every consumer on every poll. The engine is fed
+# the analysis' own level index, so both always agree; dwell times debounce it.
+event_bus = EventBus()
+alert_engine = AlertEngine(
+    thresholds=(1, 2, 3),
+    levels=CROWD_LEVELS,
+    band=0,
+    event_bus=event_bus
+)
+live_matcher.subscribe(lambda hit: event_bus.publish("watchlist_hit", hit))
+
+# Per-frame results are kept for post-event review
+analytics_store = AnalyticsStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics_data'))
+occupancy = OccupancyHeatmap()
+
+# Continuous per-location forecasts; person_count above this is reported as critical
+FORECAST_CAPACITY = 50
+forecaster = CrowdForecaster()
 
 @app.get("/")
 async def root():
     return {"message": "Drishti AI Service - Mahakumbh 2028", "status": "active"}
 
 @app.post("/analyze/crowd")
-async def analyze_crowd(file: UploadFile = File(...)):
+async def analyze_crowd(file: UploadFile = File(...), location: Optional[str] = None):
     """Analyze crowd density and behavior in uploaded image"""
     try:
-        # Read and process image
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        image_array = np.array(image)
-        
-        # Convert RGB to BGR for OpenCV
-        if len(image_array.shape) == 3:
-            image_array = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
+        image_array = decode_upload_image(file)
         
         # Perform crowd analysis
-        analysis = crowd_analyzer.analyze_crowd_density(image_array)
+        people = crowd_analyzer.detect_people(image_array, location)
+        analysis = crowd_analyzer.analyze_crowd_density(image_array, location, people)
+        
+        # Check the detected people against active lost-person reports
+        watchlist_hits = live_matcher.process(location or "default", image_array, people)
+        occupancy.add(location or "default", people, image_array.shape)
+        forecaster.update(location or "default", analysis["person_count"], FORECAST_CAPACITY)
+        
+        # Only a change of the hysteresis-filtered level produces an alert event
+        alert_event = alert_engine.update(location or "default", CROWD_LEVEL_INDEX[analysis["crowd_density"]],
+                                          details={"person_count": analysis["person_count"],
+                                                   "density_ratio": analysis["density_ratio"]})
+        stable_alert = alert_engine.current(location or "default")
+        analytics_store.append(location or "default", analysis["person_count"],
+                               density=analysis["density_ratio"],
+                               crowd_percentage=min(analysis["person_count"] / FORECAST_CAPACITY * 100, 100),
+                               crowd_level=analysis["crowd_density"],
+                               alert_level=stable_alert["alert_level"] if stable_alert else None)
         
         return {
             "success": True,
             "analysis": analysis,
+            "watchlist_hits": watchlist_hits,
+            "alert_event": alert_event,
             "timestamp": "2025-01-22T12:00:00Z"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
@@ -231,14 +377,9 @@ async def analyze_crowd(file: UploadFile = File(...)):
 async def analyze_faces(file: UploadFile = File(...)):
     """Extract facial features for lost person identification"""
     try:
-        # Read and process image
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        image_array = np.array(image)
-        
-        # Convert RGB to BGR for OpenCV
-        if len(image_array.shape) == 3:
-            image_array = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
+        if face_service.face_cascade is None:
+            raise HTTPException(status_code=503, detail="Face detection model unavailable")
+        image_array = decode_upload_image(file)
         
         # Extract face features
         faces = face_service.extract_face_features(image_array)
@@ -250,6 +391,8 @@ async def analyze_faces(file: UploadFile = File(...)):
             "timestamp": "2025-01-22T12:00:00Z"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Face analysis failed: {str(e)}")
 
@@ -281,6 +424,134 @@ async def compare_faces(face_data: Dict[str, Any]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Face comparison failed: {str(e)}")
 
+@app.post("/watchlist")
+async def add_to_watchlist(entry: Dict[str, Any]):
+    """Add an active lost-person report to the live watchlist"""
+    person_id = entry.get("person_id")
+    features = entry.get("features", [])
+    
+    if not person_id or not features:
+        raise HTTPException(status_code=400, detail="Missing person_id or face features")
+    
+    try:
+        watchlist.add(str(person_id), features, entry.get("metadata"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"success": True, "person_id": person_id, "watchlist_size": len(watchlist)}
+
+@app.delete("/watchlist/{person_id}")
+async def remove_from_watchlist(person_id: str):
+    """Remove a resolved lost-person report from the live watchlist"""
+    if not watchlist.remove(person_id):
+        raise HTTPException(status_code=404, detail="Person not on watchlist")
+    
+    return {"success": True, "person_id": person_id, "watchlist_size": len(watchlist)}
+
+@app.get("/watchlist/hits")
+async def watchlist_hits(since: int = 0):
+    """Watchlist hits with a sequence number greater than ``since``"""
+    hits = live_matcher.hits_since(since)
+    return {
+        "success": True,
+        "hits": hits,
+        "last_sequence": hits[-1]["sequence"] if hits else since
+    }
+
+@app.get("/analytics/history")
+async def analytics_history(location: Optional[str] = None, start: Optional[float] = None,
+                            end: Optional[float] = None):
+    """Stored per-frame analytics for a location and time range"""
+    rows = analytics_store.query(location, start, end,
+                                 columns=["location", "total_persons", "density", "crowd_level", "alert_level"])
+    return {
+        "success": True,
+        "count": len(rows["timestamp"]),
+        "records": {column: values.tolist() for column, values in rows.items()}
+    }
+
+@app.post("/analytics/frames")
+async def record_frame_analytics(analysis: Dict[str, Any]):
+    """Store a person counting CLI analysis; this service is the store's only writer"""
+    if "location" not in analysis or "total_persons" not in analysis:
+        raise HTTPException(status_code=400, detail="Missing location or total_persons")
+    
+    analytics_store.append(analysis["location"], int(analysis["total_persons"]),
+                           analysis.get("timestamp", analysis.get("processing_time")),
+                           zone_counts=analysis.get("zone_counts", ()),
+                           density=analysis.get("density", 0.0),
+                           crowd_percentage=analysis.get("crowd_percentage", float("nan")),
+                           crowd_level=analysis.get("crowd_level"),
+                           alert_level=analysis.get("alert_level"))
+    return {"success": True}
+
+@app.get("/forecast")
+async def forecast(location: Optional[str] = None):
+    """Short-horizon crowd forecasts for one location or all, served from memory"""
+    if location is not None:
+        prediction = forecaster.predict(location)
+        if prediction is None:
+            raise HTTPException(status_code=404, detail=f"No observations for {location}")
+        return {"success": True, "forecasts": {location: prediction}}
+    
+    return {"success": True, "forecasts": forecaster.predict_all()}
+
+@app.get("/heatmap/{location}")
+async def occupancy_heatmap(location: str, format: str = "png", hour: Optional[float] = None,
+                            width: int = 320):
+    """Live (decayed) or hourly occupancy heatmap as a PNG or a JSON grid"""
+    if format == "png":
+        image = occupancy.render(location, width=min(width, 1280), hour=hour)
+        if image is None:
+            raise HTTPException(status_code=404, detail=f"No heatmap for {location}")
+        return Response(content=image, media_type="image/png")
+    
+    values = occupancy.array(location, hour)
+    if values is None:
+        raise HTTPException(status_code=404, detail=f"No heatmap for {location}")
+    return {
+        "success": True,
+        "location": location,
+        "grid": np.round(values, 4).tolist(),
+        "hotspots": occupancy.hotspots(location, hour=hour),
+        "snapshot_hours": occupancy.snapshot_hours(location)
+    }
+
+@app.on_event("shutdown")
+def close_analytics_store():
+    analytics_store.close()
+
+@app.get("/events")
+async def poll_events(since: int = 0, timeout: float = 25.0, type: Optional[str] = None):
+    """Long-poll for events with a sequence number greater than ``since``"""
+    events = await event_bus.wait_for_events(since, min(timeout, 60.0), type)
+    return {
+        "success": True,
+        "events": events,
+        "last_sequence": events[-1]["sequence"] if events else max(since, event_bus.last_sequence)
+    }
+
+@app.get("/events/stream")
+async def stream_events(request: Request, since: int = 0, type: Optional[str] = None):
+    """Server-sent event stream of alert transitions and watchlist hits"""
+    last_event_id = request.headers.get("last-event-id")
+    sequence = int(last_event_id) if last_event_id and last_event_id.isdigit() else since
+    
+    async def event_stream():
+        nonlocal sequence
+        while not await request.is_disconnected():
+            events = await event_bus.wait_for_events(sequence, 15.0, type)
+            if not events:
+                # Keep proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                sequence = max(sequence, event_bus.last_sequence)
+                continue
+            for event in events:
+                sequence = event["sequence"]
+                yield f"id: {sequence}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -292,7 +563,11 @@ async def health_check():
             "crowd_density_analysis",
             "behavior_detection", 
             "face_recognition",
-            "lost_person_matching"
+            "lost_person_matching",
+            "live_watchlist_matching",
+            "alert_event_stream",
+            "occupancy_heatmaps",
+            "crowd_forecasting"
         ]
     }
 
@@ -111,6 +111,18 @@ export async function compareFacesWithPython(features1: number[], features2: num
   }
 }
 
+// Each CLI run is a separate process, so its analysis is stored by the AI service,
+// the analytics store's single writer. Storage failures never affect the live feed.
+function recordFrameAnalytics(analysis: any) {
+  fetch(`${PYTHON_AI_SERVICE_URL}/analytics/frames`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(analysis)
+  }).catch((error) => {
+    console.error('Python analytics store error:', error);
+  });
+}
+
 // Divine Vision Feed - Person Counting Functions
 export async function analyzeFrameForPersonCounting(
   frameData: string, 
@@ -155,6 +167,9 @@ export async function analyzeFrameForPersonCounting(
         } else {
           try {
             const result = JSON.parse(output);
+            if (result.success && result.analysis) {
+              recordFrameAnalytics(result.analysis);
+            }
             resolve(result);
           } catch (parseError) {
             console.error('Failed to parse Python output:', parseError);